@@ -4,9 +4,10 @@ import os
 import nonebot
 from loguru import logger as loguruLogger
 from nonebot.log import logger as botLogger
-from quart import Quart
+from quart import Quart, Response
 
 from utils.botConfig import convertSettingsToDict, settings
+from utils.metrics import PROMETHEUS_CONTENT_TYPE, Metrics
 
 os.chdir(os.path.split(__file__)[0])
 LOG_FILE_DIR = "./data/logs"
@@ -32,6 +33,10 @@ class _LoguruHandler(logging.Handler):
         logger.opt(depth=depth, exception=record.exc_info).log(level, message)
 
 
+async def _metricsEndpoint() -> Response:
+    return Response(Metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 def initApp() -> Quart:
     assert nonebot.scheduler  # Check if scheduler exists
     # Initialize logging
@@ -49,4 +54,8 @@ def initApp() -> Quart:
     bot = nonebot.get_bot()
     bot.logger.handlers.clear()
     bot.logger.addHandler(_LoguruHandler())
+    if settings.METRICS_ENDPOINT:
+        bot.server_app.add_url_rule(
+            settings.METRICS_ENDPOINT, "metrics", _metricsEndpoint, methods=["GET"]
+        )
     return bot.asgi
@@ -0,0 +1,75 @@
+"""Benchmark of `utils.objects.convertImageFormat`
+
+Measures CPU time and output size of converting two synthetic images,
+a 1600x1000 JPEG photo and a 3200x2000 PNG, which is over `MAX_IMAGE_SIZE`
+once decoded and re-encoded as PNG.
+
+Usage, from any directory::
+
+    python benchmarks/convertImage.py [--format JPEG|PNG] [--rounds 3]
+
+Without `--format` the format of the image section in `utils.yml` is used,
+so the script also runs on commits before that option existed,
+to compare with the old implementation check one out and run it there.
+"""
+import os
+import resource
+import sys
+from argparse import ArgumentParser
+from io import BytesIO
+
+import numpy
+from PIL import Image
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _cpuTime() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def makeImages() -> dict:
+    """Smooth gradient with gaussian noise, close to a photo for encoders"""
+    random = numpy.random.default_rng(0)
+    axis = numpy.linspace(0, 255, 1600)
+    pixels = (numpy.add.outer(axis[:1000] / 2, axis) / 1.5)[..., None].repeat(3, 2)
+    pixels += random.normal(0, 20, pixels.shape)
+    images = {}
+    photo = Image.fromarray(numpy.clip(pixels, 0, 255).astype("uint8"))
+    with BytesIO() as buffer:
+        photo.save(buffer, "JPEG", quality=95)
+        images["1600x1000 JPEG"] = buffer.getvalue()
+    scaled = numpy.kron(pixels, numpy.ones((2, 2, 1)))
+    large = Image.fromarray(numpy.clip(scaled, 0, 255).astype("uint8"))
+    with BytesIO() as buffer:
+        large.save(buffer, "PNG")
+        images["3200x2000 PNG"] = buffer.getvalue()
+    return images
+
+
+def main():
+    parser = ArgumentParser(description="Benchmark image conversion")
+    parser.add_argument("--format", help="output format, by default from utils.yml")
+    parser.add_argument("--rounds", type=int, default=3, help="runs per image")
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)
+    sys.path.insert(0, ROOT_DIR)
+    from utils.objects import MAX_IMAGE_SIZE, convertImageFormat
+
+    options = {"format": args.format} if args.format else {}
+    for name, data in makeImages().items():
+        startTime = _cpuTime()
+        for _ in range(args.rounds):
+            result = convertImageFormat(data, **options)
+        costTime = (_cpuTime() - startTime) / args.rounds * 1000
+        print(
+            f"{name:16s} cpu {costTime:8.0f}ms  "
+            + f"output {len(result) / 1024 ** 2:.2f}MiB"
+            + ("" if len(result) <= MAX_IMAGE_SIZE else "  over the limit")
+        )
+
+
+if __name__ == "__main__":
+    main()
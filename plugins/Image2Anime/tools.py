@@ -1,6 +1,5 @@
 from base64 import b64encode
 
-import requests
 from PIL import Image
 
 from utils.decorators import CatchRequestsException
@@ -9,12 +8,19 @@ from utils.tmpFile import tmpFile
 
 from .config import Config
 
+# GIF images are shrunk to their first frames after downloading
+MAX_DOWNLOAD_SIZE = 8 * 1024 ** 2
+
 
 @CatchRequestsException(prompt="下载用户发出图片失败")
 def imageDownload(url: str) -> bytes:
-    data = requests.get(url, timeout=(3, 6))
-    data.raise_for_status()
-    dataBytes = data.content
+    dataBytes = NetworkUtils.downloadSync(
+        url,
+        timeout=(3, 6),
+        proxy=False,
+        maxSize=MAX_DOWNLOAD_SIZE,
+        contentTypes=("image/",),
+    )
     return dataBytes
 
 
@@ -26,9 +32,8 @@ def whatanimeUpload(file: bytes) -> dict:
         "headers": {"Content-Type": "application/json"},
         "json": {"image": fileEncoded},
         "timeout": (3, 21),
-        "proxies": NetworkUtils.proxy,
     }
-    data = requests.post(**params)
+    data = NetworkUtils.postSync(**params)
     data.raise_for_status()
     return data.json()
 
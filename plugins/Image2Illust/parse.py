@@ -2,7 +2,6 @@ from re import compile as compileRegexp
 from typing import Any, Dict, Optional
 from urllib.parse import urljoin, urlparse
 
-import requests
 from lxml import etree
 from nonebot import MessageSegment
 
@@ -19,7 +18,7 @@ _ASCII2D_ADDRESS = f"{_ASCII2D_PARSE.scheme}://{_ASCII2D_PARSE.netloc}/"
 @CatchRequestsException(prompt="搜索图片失败", retries=Config.apis.retries)
 def searchImage(imageURL: str) -> str:
     fullURL = str(Config.apis.ascii2d) + imageURL
-    getResult = requests.get(fullURL, timeout=6, proxies=NetworkUtils.proxy)
+    getResult = NetworkUtils.getSync(fullURL, timeout=6)
     getResult.raise_for_status()
     return getResult.text
 
@@ -24,7 +24,7 @@ PluginManager.registerPlugin(OPERATING_METHOD)
 @on_command(__plugin_name__, aliases=("setu", "涩图", "色图"))
 @processSession(pluginName=__plugin_name__)
 @WithKeyword("来一张涩图", command=__plugin_name__)
-@SyncToAsync
+@SyncToAsync(executor=__plugin_name__)
 def NSFWImage(session: CommandSession):
     rank: str = session.get_optional("rank", Config.send.default)
     pictureCount: int = session.get_optional("num", 1)
@@ -1,58 +1,33 @@
-from base64 import b64encode
 import datetime
-from itertools import count
-from typing import Iterator, Optional
 
 from nonebot import CommandSession, on_command
 from nonebot.message import MessageSegment
 from nonebot.permission import GROUP_ADMIN, PRIVATE, SUPERUSER
 
+from utils.charts import renderChatFrequency, renderWordcloud
 from utils.decorators import SyncToAsync
+from utils.mediaStore import MediaStore
 from utils.message import processSession
 
-from . import models, record
-from .access import MAX_PAGE_SIZE
-from .chart.cloud import WordcloudMaker
-from .chart.statistics import DataFrameMaker, Chart
+from . import record
+from .cache import RenderCache
+from .chart.cloud import mergeWords
+from .chart.statistics import DataFrameMaker
 
 DatabaseIO = record.DatabaseIO
+RecordBuffer = record.RecordBuffer
+ImageCache = RenderCache()
 POWER_GROUP = GROUP_ADMIN | SUPERUSER | PRIVATE
 DELTA_TIME = datetime.timedelta(days=7)
 
 
-def messageGenterator(
-    group_id: Optional[int] = None,
-    user_id: Optional[int] = None,
-    newestTime: datetime.datetime = datetime.datetime.max,
-    latestTime: datetime.datetime = datetime.datetime.min,
-) -> Iterator[models.RecordsRead]:
-    assert newestTime >= latestTime
-    for offset in count(0, MAX_PAGE_SIZE):
-        result = DatabaseIO.recordReadBulk(
-            user=user_id,
-            group=group_id,
-            reversed=True,
-            limit=MAX_PAGE_SIZE,
-            offset=offset,
-        )
-        if not result:
-            break
-        for data in result:
-            if data.time <= latestTime:
-                return
-            elif data.time >= newestTime:
-                continue
-            yield data
-    return
-
-
-def _time2Int(time: datetime.time) -> int:
-    return datetime.timedelta(
-        hours=time.hour,
-        minutes=time.minute,
-        seconds=time.second,
-        microseconds=time.microsecond,
-    ).total_seconds()
+def _cacheKey(command: str, type: str, id: int, untilToday: bool = True) -> str:
+    """Key of a rendered image, images covering today also change with activity"""
+    now = datetime.datetime.now()
+    if not untilToday:
+        return ImageCache.key(command, type, id, now.date())
+    lastActive = RecordBuffer.lastActivity(type, id) or now
+    return ImageCache.key(command, type, id, now.date(), lastActive)
 
 
 def _datetimeRound(date: datetime.datetime) -> datetime.datetime:
@@ -62,48 +37,86 @@ def _datetimeRound(date: datetime.datetime) -> datetime.datetime:
 
 @on_command("wordcloud", aliases=("词云", "高频词"), permission=POWER_GROUP)
 @processSession
+async def _(session: CommandSession):
+    await session.send("开始生成词云")
+    # Frequencies are stored per day, so the window is the last days including today
+    latestDate = datetime.date.today() - DELTA_TIME + datetime.timedelta(days=1)
+    scope, id = (
+        ("group", session.ctx["group_id"])
+        if "group_id" in session.ctx
+        else ("user", session.ctx["user_id"])
+    )
+
+    async def render() -> bytes:
+        wordsRead = SyncToAsync(DatabaseIO.wordsRead)
+        frequency = await wordsRead(scope, id, latestDate=latestDate)
+        return await renderWordcloud(await SyncToAsync(mergeWords)(frequency))
+
+    imageData = await ImageCache.render(_cacheKey("wordcloud", scope, id), render)
+    return MessageSegment.image(await SyncToAsync(MediaStore.image)(imageData))
+
+
+@on_command("wordcloud_rebuild", aliases=("重建词频",), permission=SUPERUSER)
+@processSession
 @SyncToAsync
 def _(session: CommandSession):
-    session.send("开始生成词云")
-    latestTime = datetime.datetime.now() - DELTA_TIME
-    if "group_id" in session.ctx:
-        messageIter = messageGenterator(
-            group_id=session.ctx["group_id"], latestTime=latestTime
-        )
-    else:
-        messageIter = messageGenterator(
-            user_id=session.ctx["user_id"], latestTime=latestTime
-        )
-    wordcloud = WordcloudMaker()
-    for data in messageIter:
-        data: models.RecordsRead
-        sentence = data.content
-        wordcloud.update(sentence)
-    imageData = wordcloud.save()
-    return MessageSegment.image(f"base64://{b64encode(imageData).decode()}")
+    session.send("开始重建词频数据")
+    total = record.rebuildWords()
+    ImageCache.clear("wordcloud")
+    return f"词频数据重建完成,共处理{total}条记录"
 
 
 @on_command("statistics", aliases=("统计",), permission=POWER_GROUP)
 @processSession
-@SyncToAsync
-def _(session: CommandSession):
-    session.send("开始生成统计")
-    latestTime = datetime.datetime.now() - DELTA_TIME
+async def _(session: CommandSession):
+    await session.send("开始生成统计")
+    latestTime = _datetimeRound(datetime.datetime.now() - DELTA_TIME)
     newestTime = _datetimeRound(datetime.datetime.now())
-    frameMaker = DataFrameMaker({"date": str, "time": float})
-    if "group_id" in session.ctx:
-        messageIter = messageGenterator(
-            group_id=session.ctx["group_id"],
-            newestTime=newestTime,
-            latestTime=latestTime,
+    scope, id = (
+        ("group", session.ctx["group_id"])
+        if "group_id" in session.ctx
+        else ("user", session.ctx["user_id"])
+    )
+
+    async def render() -> bytes:
+        statisticsRead = SyncToAsync(DatabaseIO.statisticsRead)
+        statistics = await statisticsRead(
+            scope, id, newestTime=newestTime, latestTime=latestTime
         )
-    else:
-        messageIter = messageGenterator(
-            user_id=session.ctx["user_id"], newestTime=newestTime, latestTime=latestTime
+        frameMaker = DataFrameMaker({"date": str, "hour": int, "count": int})
+        frameMaker.extend(
+            {"date": str(data.hour.date()), "hour": data.hour.hour, "count": data.count}
+            for data in statistics
         )
-    for data in messageIter:
-        date = str(data.time.date())
-        time = _time2Int(data.time.time())
-        frameMaker.update({"date": date, "time": time})
-    imageData = Chart.chatFrequency(frameMaker.read())
-    return MessageSegment.image(f"base64://{b64encode(imageData).decode()}")
+        return await renderChatFrequency(frameMaker.read())
+
+    # The window ends at midnight, so the image only changes by day
+    imageData = await ImageCache.render(
+        _cacheKey("statistics", scope, id, untilToday=False), render
+    )
+    return MessageSegment.image(await SyncToAsync(MediaStore.image)(imageData))
+
+
+@on_command("statistics_rebuild", aliases=("重建统计",), permission=SUPERUSER)
+@processSession
+@SyncToAsync
+def _(session: CommandSession):
+    session.send("开始重建统计数据")
+    RecordBuffer.flush()
+    total = DatabaseIO.statisticsRebuild()
+    ImageCache.clear("statistics")
+    return f"统计数据重建完成,共{total}条记录"
+
+
+@on_command("record_status", aliases=("记录状态",), permission=SUPERUSER)
+@processSession
+@SyncToAsync
+def _(session: CommandSession):
+    status = RecordBuffer.statistics
+    return (
+        f"缓冲队列:{status['depth']}条,写入中:{status['inflight']}条\n"
+        + f"已入队:{status['enqueued']}条,已写入:{status['written']}条\n"
+        + f"写入失败:{status['failed']}条,已丢弃:{status['dropped']}条\n"
+        + f"共写入{status['flushes']}批,平均耗时{status['flush_time_avg']:.3f}ms,"
+        + f"最长{status['flush_time_max']:.3f}ms"
+    )
@@ -1,17 +1,25 @@
-from typing import Any, Dict, List, Optional, Union
+import json
+from collections import Counter
+from datetime import date, datetime
+from hashlib import sha1
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
-from sqlalchemy import create_engine, desc
-from sqlalchemy.orm import Session, sessionmaker
+from pydantic import BaseModel
+from sqlalchemy import Date, and_, bindparam, create_engine, desc, func, or_
+from sqlalchemy.orm import Query, Session, sessionmaker
 
 from utils.exception import BotNotFoundError, BotExistError
 from utils.botConfig import settings
 
-from . import models, tables
+from . import migrations, models, tables
 
 DATABASE_URL = "sqlite:///./data/database.sqlite3"
 DATABASE_CONFIG = {"check_same_thread": False}
 DATABASE_DEBUG = settings.DEBUG
 MAX_PAGE_SIZE = 200
+STREAM_CHUNK_SIZE = 2000
+
+RecordCursor = Tuple[datetime, int]
 
 
 class DatabaseTransaction:
@@ -33,7 +41,9 @@ class RecordDAO:
         self.engine = create_engine(
             DATABASE_URL, connect_args=DATABASE_CONFIG or None, echo=DATABASE_DEBUG
         )
+        freshDatabase = not self.engine.has_table(tables.ChatRecords.__tablename__)
         tables.Base.metadata.create_all(bind=self.engine)
+        migrations.upgrade(self.engine, fresh=freshDatabase)
         self.sessionFactory = sessionmaker(
             bind=self.engine, autocommit=True, autoflush=True
         )
@@ -42,6 +52,11 @@ class RecordDAO:
     def table2dict(table: Any) -> Dict[str, Any]:
         return dict(table.__dict__)
 
+    @staticmethod
+    def contentHash(data: BaseModel) -> str:
+        dumpedData = json.dumps(data.dict(), ensure_ascii=False, sort_keys=True)
+        return sha1(dumpedData.encode()).hexdigest()
+
     def connect(self) -> DatabaseTransaction:
         return DatabaseTransaction(self.sessionFactory())
 
@@ -53,6 +68,95 @@ class RecordDAO:
             result = models.RecordsRead(**self.table2dict(table))
         return result
 
+    @staticmethod
+    def _wordsIncrease(session: Session, words: models.WordsFrequency_T):
+        wordsData = [
+            {"scope": scope, "id": id, "date": day, "word": word, "count": count}
+            for (scope, id, day), frequency in words.items()
+            for word, count in frequency.items()
+        ]
+        if not wordsData:
+            return
+        session.execute(
+            tables.WORDS_INCREASE.bindparams(bindparam("date", type_=Date)), wordsData
+        )
+
+    def recordCreateBulk(
+        self,
+        dataList: List[models.RecordsCreate],
+        words: Optional[models.WordsFrequency_T] = None,
+    ) -> int:
+        if not dataList:
+            return 0
+        statistics: Counter = Counter()
+        for data in dataList:
+            hour = data.time.replace(minute=0, second=0, microsecond=0)
+            statistics["user", data.sender, hour] += 1
+            if data.group is not None:
+                statistics["group", data.group, hour] += 1
+        with self.connect() as session:
+            session.bulk_insert_mappings(
+                tables.ChatRecords, [dict(data) for data in dataList]
+            )
+            session.execute(
+                tables.STATISTICS_INCREASE.bindparams(
+                    bindparam("hour", type_=tables.DatetimeIO)
+                ),
+                [
+                    {"scope": scope, "id": id, "hour": hour, "count": count}
+                    for (scope, id, hour), count in statistics.items()
+                ],
+            )
+            if words:
+                self._wordsIncrease(session, words)
+        return len(dataList)
+
+    def statisticsRead(
+        self,
+        type: str,
+        id: int,
+        newestTime: Optional[datetime] = None,
+        latestTime: Optional[datetime] = None,
+    ) -> List[models.Statistics]:
+        """Read hourly message counts of a chat
+
+        Parameters
+        ----------
+        type : str
+            Location type, select group or user
+        id : int
+            The ID of the selected type
+        newestTime : Optional[datetime], optional
+            Only hours earlier than this time, by default None
+        latestTime : Optional[datetime], optional
+            Only hours starting from this time, by default None
+        """
+        assert type in ("group", "user")
+        table = tables.ChatStatistics
+        with self.connect() as session:
+            query = session.query(table).filter(table.scope == type, table.id == id)
+            if newestTime is not None:
+                query = query.filter(table.hour < newestTime)
+            if latestTime is not None:
+                query = query.filter(table.hour >= latestTime)
+            result = query.order_by(table.hour)
+            dataList = [models.Statistics(**self.table2dict(i)) for i in result]
+        return dataList
+
+    def statisticsRebuild(self) -> int:
+        """Rebuild hourly message counts from all stored records
+
+        Returns
+        -------
+        int
+            Number of hourly statistics rows
+        """
+        with self.connect() as session:
+            session.execute(tables.STATISTICS_CLEAR)
+            session.execute(tables.STATISTICS_REBUILD)
+            total = session.query(tables.ChatStatistics).count()
+        return total
+
     def recordRead(self, rid: int) -> models.RecordsRead:
         with self.connect() as session:
             result = (
@@ -93,6 +197,144 @@ class RecordDAO:
             allData = [models.RecordsRead(**self.table2dict(i)) for i in result]
         return allData
 
+    @staticmethod
+    def _recordKeyset(
+        query: Query,
+        user: Optional[int] = None,
+        group: Optional[int] = None,
+        newestTime: Optional[datetime] = None,
+        latestTime: Optional[datetime] = None,
+        cursor: Optional[RecordCursor] = None,
+        reversed: bool = False,
+    ) -> Query:
+        table = tables.ChatRecords
+        if user is not None:
+            query = query.filter(table.sender == user)
+        if group is not None:
+            query = query.filter(table.group == group)
+        if newestTime is not None:
+            query = query.filter(table.time < newestTime)
+        if latestTime is not None:
+            query = query.filter(table.time > latestTime)
+        if cursor is not None:
+            cursorTime, cursorID = cursor
+            query = query.filter(
+                or_(
+                    (
+                        (table.time < cursorTime)
+                        if reversed
+                        else (table.time > cursorTime)
+                    ),
+                    and_(
+                        table.time == cursorTime,
+                        (table.rid < cursorID) if reversed else (table.rid > cursorID),
+                    ),
+                )
+            )
+        return query.order_by(
+            *(
+                (desc(table.time), desc(table.rid))
+                if reversed
+                else (table.time, table.rid)
+            )
+        )
+
+    def recordStream(
+        self,
+        user: Optional[int] = None,
+        group: Optional[int] = None,
+        newestTime: Optional[datetime] = None,
+        latestTime: Optional[datetime] = None,
+        reversed: bool = False,
+        chunkSize: int = STREAM_CHUNK_SIZE,
+    ) -> Iterator[models.RecordsBrief]:
+        """Stream `rid`, `time`, `content`, `sender` and `group` of matched records
+
+        Records are fetched chunk by chunk with a keyset cursor,
+        so no read transaction is held while the caller consumes them.
+        """
+        table = tables.ChatRecords
+        cursor: Optional[RecordCursor] = None
+        while True:
+            with self.connect() as session:
+                query = self._recordKeyset(
+                    session.query(
+                        table.rid, table.time, table.content, table.sender, table.group
+                    ),
+                    user=user,
+                    group=group,
+                    newestTime=newestTime,
+                    latestTime=latestTime,
+                    cursor=cursor,
+                    reversed=reversed,
+                )
+                chunk = [
+                    models.RecordsBrief(*row)
+                    for row in query.limit(chunkSize).yield_per(MAX_PAGE_SIZE)
+                ]
+            yield from chunk
+            if len(chunk) < chunkSize:
+                return
+            cursor = (chunk[-1].time, chunk[-1].rid)
+
+    def wordsIncrease(self, words: models.WordsFrequency_T):
+        with self.connect() as session:
+            self._wordsIncrease(session, words)
+
+    def wordsRead(
+        self,
+        type: str,
+        id: int,
+        newestDate: Optional[date] = None,
+        latestDate: Optional[date] = None,
+    ) -> Dict[str, int]:
+        """Sum daily word frequencies of a chat
+
+        Parameters
+        ----------
+        type : str
+            Location type, select group or user
+        id : int
+            The ID of the selected type
+        newestDate : Optional[date], optional
+            Only days earlier than this date, by default None
+        latestDate : Optional[date], optional
+            Only days starting from this date, by default None
+        """
+        assert type in ("group", "user")
+        table = tables.ChatWords
+        with self.connect() as session:
+            query = session.query(table.word, func.sum(table.count)).filter(
+                table.scope == type, table.id == id
+            )
+            if newestDate is not None:
+                query = query.filter(table.date < newestDate)
+            if latestDate is not None:
+                query = query.filter(table.date >= latestDate)
+            result = dict(query.group_by(table.word))
+        return result
+
+    def wordsMissing(self) -> bool:
+        """Whether records are stored but no word frequencies are"""
+        with self.connect() as session:
+            hasWords = session.query(tables.ChatWords.scope).first() is not None
+            hasRecords = session.query(tables.ChatRecords.rid).first() is not None
+        return hasRecords and not hasWords
+
+    def wordsClear(self) -> int:
+        """Delete all word frequencies
+
+        Returns
+        -------
+        int
+            The largest `rid` when cleared, records after it are counted
+            by the writer so a rebuild must stop there
+        """
+        with self.connect() as session:
+            session.query(tables.ChatWords).delete()
+            maxRid = session.query(func.max(tables.ChatRecords.rid)).scalar()
+        return maxRid or 0
+
     def recordDelete(self, rid: int):
         with self.connect() as session:
             result = (
@@ -119,7 +361,7 @@ class RecordDAO:
                     raise BotExistError("此条记录已在数据库中存在")
                 else:
                     return
-            table = tables.Users(**dict(data))
+            table = tables.Users(**dict(data), hash=self.contentHash(data))
             session.add(table)
             session.flush()
             result = models.Users(**self.table2dict(table))
@@ -153,10 +395,30 @@ class RecordDAO:
                 if getattr(result, k) == v:
                     continue
                 setattr(result, k, v)
+            result.hash = self.contentHash(data)
             session.flush()
             data = models.Users(**self.table2dict(result))
         return data
 
+    def userUpsertBulk(self, dataList: List[models.Users]) -> int:
+        """Insert or update users in a single transaction,
+        rows whose content hash is unchanged are skipped
+
+        Returns
+        -------
+        int
+            Number of rows inserted or updated
+        """
+        if not dataList:
+            return 0
+        with self.connect() as session:
+            result = session.execute(
+                tables.USERS_UPSERT.bindparams(bindparam("data", type_=tables.JsonIO)),
+                [{**dict(data), "hash": self.contentHash(data)} for data in dataList],
+            )
+            changed = result.rowcount
+        return changed
+
     def userDelete(self, uid: int):
         with self.connect() as session:
             result = session.query(tables.Users).filter(tables.Users.uid == uid).first()
@@ -183,7 +445,7 @@ class RecordDAO:
                     raise BotExistError("此条记录已在数据库中存在")
                 else:
                     return
-            table = tables.Groups(**dict(data))
+            table = tables.Groups(**dict(data), hash=self.contentHash(data))
             session.add(table)
             session.flush()
             result = models.Groups(**self.table2dict(table))
@@ -196,7 +458,7 @@ class RecordDAO:
             result = (
                 session.query(tables.Groups)
                 .filter((tables.Groups.gid == gid) if gid is not None else True)
-                .order_by(tables.Groups.uid)
+                .order_by(tables.Groups.gid)
                 .limit(limit if limit <= MAX_PAGE_SIZE else MAX_PAGE_SIZE)
                 .offset(offset)
                 .all()
@@ -219,10 +481,32 @@ class RecordDAO:
                 if getattr(result, k) == v:
                     continue
                 setattr(result, k, v)
+            result.hash = self.contentHash(data)
             session.flush()
             data = models.Groups(**self.table2dict(result))
         return data
 
+    def groupUpsertBulk(self, dataList: List[models.Groups]) -> int:
+        """Insert or update groups in a single transaction,
+        rows whose content hash is unchanged are skipped
+
+        Returns
+        -------
+        int
+            Number of rows inserted or updated
+        """
+        if not dataList:
+            return 0
+        with self.connect() as session:
+            result = session.execute(
+                tables.GROUPS_UPSERT.bindparams(
+                    bindparam("members", type_=tables.JsonIO)
+                ),
+                [{**dict(data), "hash": self.contentHash(data)} for data in dataList],
+            )
+            changed = result.rowcount
+        return changed
+
     def groupDelete(self, gid: int):
         with self.connect() as session:
             result = (
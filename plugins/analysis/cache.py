@@ -0,0 +1,163 @@
+import asyncio
+import os
+from collections import OrderedDict
+from datetime import date, datetime
+from threading import Lock
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from nonebot.log import logger
+
+from utils.decorators import SyncToAsync
+from utils.objects import imageExtension
+
+CACHE_DIR = "./data/analysis"
+CACHE_MAX_SIZE = 64 * 1024 ** 2
+BUCKET_SECONDS = 10 * 60
+IMAGE_EXTENSIONS = (".png", ".jpg", ".webp", ".gif")
+
+
+class RenderCache:
+    def __init__(
+        self,
+        cacheDir: str = CACHE_DIR,
+        maxSize: int = CACHE_MAX_SIZE,
+        bucketSeconds: int = BUCKET_SECONDS,
+    ):
+        """Disk cache of rendered images with LRU eviction
+
+        Parameters
+        ----------
+        cacheDir : str, optional
+            Directory to store images, by default "./data/analysis"
+        maxSize : int, optional
+            Maximum total bytes of cached images, by default 64MiB
+        bucketSeconds : int, optional
+            Width of the time bucket used in keys, by default 10 minutes
+        """
+        os.makedirs(cacheDir, exist_ok=True)
+        self._dir, self._maxSize, self._bucket = cacheDir, maxSize, bucketSeconds
+        self._lock = Lock()
+        # Key of each image to the name of its file and its size
+        self._entries: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+        self._rendering: Dict[str, asyncio.Future] = {}
+        files = [
+            i
+            for i in os.scandir(cacheDir)
+            if i.is_file() and os.path.splitext(i.name)[1] in IMAGE_EXTENSIONS
+        ]
+        for entry in sorted(files, key=lambda x: x.stat().st_mtime):
+            key = os.path.splitext(entry.name)[0]
+            self._entries[key] = (entry.name, entry.stat().st_size)
+        self._evict()
+
+    def key(
+        self,
+        command: str,
+        type: str,
+        id: int,
+        day: date,
+        lastActive: Optional[datetime] = None,
+    ) -> str:
+        """Build a cache key
+
+        `lastActive` is the time of the latest message of the chat,
+        so a key changes once new messages land in a later bucket.
+        Images which do not cover today leave it out and change by day only.
+        """
+        key = f"{command}-{type}-{id}-{day:%Y%m%d}"
+        if lastActive is None:
+            return key
+        return f"{key}-{int(lastActive.timestamp() // self._bucket)}"
+
+    def _path(self, fileName: str) -> str:
+        return os.path.join(self._dir, fileName)
+
+    def _evict(self):
+        totalSize = sum(size for _, size in self._entries.values())
+        while self._entries and totalSize > self._maxSize:
+            key, (fileName, size) = self._entries.popitem(last=False)
+            totalSize -= size
+            try:
+                os.remove(self._path(fileName))
+            except FileNotFoundError:
+                pass
+            logger.debug(f"Rendered image {key} has been evicted from cache.")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            fileName, _ = self._entries[key]
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(fileName), "rb") as f:
+                data = f.read()
+            os.utime(self._path(fileName))
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        fileName = f"{key}.{imageExtension(data)}"
+        tempPath = self._path(fileName) + ".tmp"
+        with open(tempPath, "wb") as f:
+            f.write(data)
+        os.replace(tempPath, self._path(fileName))
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None and previous[0] != fileName:
+                try:
+                    os.remove(self._path(previous[0]))
+                except FileNotFoundError:
+                    pass
+            self._entries[key] = (fileName, len(data))
+            self._evict()
+
+    def clear(self, command: str) -> int:
+        """Drop cached images of `command`, after the data they show was rebuilt
+
+        Returns
+        -------
+        int
+            Number of dropped images
+        """
+        with self._lock:
+            keys = [i for i in self._entries if i.startswith(f"{command}-")]
+            fileNames = [self._entries.pop(i)[0] for i in keys]
+        for fileName in fileNames:
+            try:
+                os.remove(self._path(fileName))
+            except FileNotFoundError:
+                pass
+        return len(fileNames)
+
+    async def render(self, key: str, renderer: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Return the cached image of `key`, or render and cache it
+
+        Concurrent calls with the same key share one rendering.
+        """
+        cached = await SyncToAsync(self.get)(key)
+        if cached is not None:
+            logger.debug(f"Rendered image {key} is served from cache.")
+            return cached
+        if key in self._rendering:
+            return await asyncio.shield(self._rendering[key])
+        future = asyncio.get_event_loop().create_future()
+        self._rendering[key] = future
+        try:
+            data = await renderer()
+            await SyncToAsync(self.put)(key, data)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        else:
+            future.set_result(data)
+        finally:
+            del self._rendering[key]
+        return data
@@ -1,56 +1,124 @@
-from typing import Dict, List
+import re
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Dict, Iterable, List, Tuple, Union
 
 import jieba
-from wordcloud import WordCloud
+from wordcloud import STOPWORDS, WordCloud
+from wordcloud.tokenization import score
 
-from utils.objects import convertImageFormat
-from utils.tmpFile import tmpFile
-
-FONT_PATH = "./data/font.otf"
-CACHE_LENGTH = 1000
+from .. import models
 
 FreqDict = Dict[str, int]
 JIEBA_INIT = False
 
+_PROCESSOR = WordCloud()
+_TOKEN_REGEX = re.compile(
+    _PROCESSOR.regexp
+    or (r"\w[\w']*" if _PROCESSOR.min_word_length <= 1 else r"\w[\w']+")
+)
+_STOPWORDS = {i.lower() for i in STOPWORDS}
+
+
+def _initJieba():
+    global JIEBA_INIT
+    if not JIEBA_INIT:
+        jieba.initialize()
+        JIEBA_INIT = True
+
+
+def _tokenize(text: str) -> List[str]:
+    """Tokens of `text` as `WordCloud.process_text` finds them"""
+    _initJieba()
+    cutText: List[str] = [i for i in jieba.cut(text) if not i.isascii()]
+    words = _TOKEN_REGEX.findall(" ".join(cutText))
+    words = [i[:-2] if i.lower().endswith("'s") else i for i in words]
+    return [i for i in words if not i.isdigit()]
+
+
+def countWords(text: str) -> FreqDict:
+    """Count tokens of `text` and pairs of adjacent tokens, joined by a space
+
+    Counts of different texts can be summed,
+    `mergeWords` turns the sum into the frequencies of words to draw.
+    """
+    words = _tokenize(text)
+    stopped = [i.lower() in _STOPWORDS for i in words]
+    frequency = Counter(i for i, stop in zip(words, stopped) if not stop)
+    frequency.update(
+        f"{words[i]} {words[i + 1]}"
+        for i in range(len(words) - 1)
+        if not (stopped[i] or stopped[i + 1])
+    )
+    return dict(frequency)
+
+
+def _foldTokens(counts: FreqDict) -> Tuple[FreqDict, Dict[str, str]]:
+    """`wordcloud.tokenization.process_tokens` for counted tokens
+
+    Returns
+    -------
+    Tuple[FreqDict, Dict[str, str]]
+        Counts with cases and plurals merged,
+        and the standard form of each lower-case token
+    """
+    cases: Dict[str, FreqDict] = defaultdict(dict)
+    for word, count in counts.items():
+        caseCounts = cases[word.lower()]
+        caseCounts[word] = caseCounts.get(word, 0) + count
+    plurals: Dict[str, str] = {}
+    for key in [*cases.keys()]:
+        if key.endswith("s") and not key.endswith("ss") and key[:-1] in cases:
+            singular = cases[key[:-1]]
+            for word, count in cases.pop(key).items():
+                singular[word[:-1]] = singular.get(word[:-1], 0) + count
+            plurals[key] = key[:-1]
+    folded, standard = {}, {}
+    for key, caseCounts in cases.items():
+        word = max(caseCounts.items(), key=itemgetter(1))[0]
+        folded[word] = sum(caseCounts.values())
+        standard[key] = word
+    for plural, singular in plurals.items():
+        standard[plural] = standard[singular]
+    return folded, standard
+
+
+def mergeWords(frequency: FreqDict) -> FreqDict:
+    """Frequencies of words to draw from summed counts of `countWords`
+
+    The result is what `WordCloud.process_text` gives for all texts at once,
+    pairs of tokens which are collocations replace the tokens themselves.
+    """
+    wordCounts, standard = _foldTokens(
+        {k: v for k, v in frequency.items() if " " not in k}
+    )
+    pairCounts, _ = _foldTokens({k: v for k, v in frequency.items() if " " in k})
+    originCounts = wordCounts.copy()
+    totalWords = sum(originCounts.values())
+    for pair, count in pairCounts.items():
+        first, second = (standard[i.lower()] for i in pair.split(" "))
+        pairScore = score(count, originCounts[first], originCounts[second], totalWords)
+        if pairScore > _PROCESSOR.collocation_threshold:
+            wordCounts[first] -= count
+            wordCounts[second] -= count
+            wordCounts[pair] = count
+    return {k: v for k, v in wordCounts.items() if v > 0}
+
+
+def countRecordWords(
+    records: Iterable[Union[models.RecordsCreate, models.RecordsBrief]],
+) -> models.WordsFrequency_T:
+    """Count tokens of records per chat per day, see `countWords`
 
-class WordcloudMaker:
-    def __init__(self):
-        global JIEBA_INIT
-        if not JIEBA_INIT:
-            jieba.initialize()
-            JIEBA_INIT = True
-
-        self._wordcloud = WordCloud(
-            font_path=FONT_PATH, width=1920, height=1080, background_color="white"
-        )
-        self._wordFreqency: FreqDict = {}
-        self._messageStorage = ""
-
-    def updateFreqency(self, data: FreqDict) -> FreqDict:
-        for k, v in data.items():
-            if k in self._wordFreqency:
-                self._wordFreqency[k] += v
-            else:
-                self._wordFreqency[k] = v
-        return self._wordFreqency.copy()
-
-    def update(self, text: str, force: bool = False) -> FreqDict:
-        if (len(self._messageStorage) <= CACHE_LENGTH) and not force:
-            self._messageStorage += f"\n{text}"
-            return self._wordFreqency.copy()
-        else:
-            text = self._messageStorage + f"\n{text}"
-            self._messageStorage = ""
-        cutText: List[str] = [i for i in jieba.cut(text) if not i.isascii()]
-        freqDict = self._wordcloud.process_text(" ".join(cutText))
-        return self.updateFreqency(freqDict)
-
-    def save(self) -> bytes:
-        if self._messageStorage:
-            self.update(self._messageStorage, force=True)
-        wordcloud = self._wordcloud.generate_from_frequencies(self._wordFreqency)
-        with tmpFile(ext=".png") as tmpFileName:
-            wordcloud.to_file(tmpFileName)
-            with open(tmpFileName, "rb") as f:
-                fileRead = f.read()
-        return convertImageFormat(fileRead)
+    Each record is counted for its sender and, if sent in a group, for the group.
+    """
+    words: Dict[tuple, Counter] = defaultdict(Counter)
+    for data in records:
+        frequency = countWords(data.content)
+        if not frequency:
+            continue
+        day = data.time.date()
+        words["user", data.sender, day].update(frequency)
+        if data.group is not None:
+            words["group", data.group, day].update(frequency)
+    return {k: dict(v) for k, v in words.items()}
@@ -1,38 +1,48 @@
-from typing import Any, Dict
+from array import array
+from typing import Any, Dict, Iterable, List, Union
 
-import seaborn as sns
+import numpy
 from pandas import DataFrame
 
-from utils.tmpFile import tmpFile
+_ARRAY_TYPECODES = {int: "q", float: "d", bool: "b"}
+
+Column_T = Union[array, List[Any]]
 
 
 class DataFrameMaker:
     def __init__(self, index: Dict[str, object]):
+        """Collect rows column by column and build a `DataFrame` once
+
+        Parameters
+        ----------
+        index : Dict[str, object]
+            Column names and their types, `int`, `float` and `bool` columns
+            are stored in typed arrays, others in lists
+        """
         self._index = index
-        self._frame = DataFrame(index=[*index.keys()])
+        self._columns: Dict[str, Column_T] = {
+            k: array(_ARRAY_TYPECODES[v]) if v in _ARRAY_TYPECODES else []
+            for k, v in index.items()
+        }
+        self._rows = 0
 
     def update(self, data: Dict[str, Any]) -> int:
-        frameData = {k: data[k] for k in self._index.keys()}
-        self._frame = self._frame.append(frameData, ignore_index=True)
-        return self._frame.size
+        return self.extend((data,))
+
+    def extend(self, records: Iterable[Dict[str, Any]]) -> int:
+        keys, columns = [*self._columns.keys()], [*self._columns.values()]
+        for data in records:
+            values = [data[k] for k in keys]
+            for column, value in zip(columns, values):
+                column.append(value)
+            self._rows += 1
+        return self._rows * len(columns)
 
     def read(self) -> DataFrame:
-        return self._frame
-
-
-class Chart:
-    @staticmethod
-    def _toImage(grid: sns.FacetGrid) -> bytes:
-        with tmpFile(ext=".png") as tmpFileName:
-            grid.savefig(tmpFileName)
-            with open(tmpFileName, "rb") as f:
-                fileRead = f.read()
-        return fileRead
-
-    @classmethod
-    def chatFrequency(cls, data: DataFrame):
-        assert "date" in data
-        assert "time" in data
-        grid = sns.FacetGrid(data=data, row="date", aspect=2)
-        grid.map(sns.distplot, "time", rug=True, kde=True)
-        return cls._toImage(grid)
+        return DataFrame(
+            {
+                k: numpy.array(column) if isinstance(column, array) else column
+                for k, column in self._columns.items()
+            },
+            columns=[*self._index.keys()],
+        )
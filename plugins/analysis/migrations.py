@@ -0,0 +1,118 @@
+from typing import Callable, List, NamedTuple
+
+from nonebot.log import logger
+from sqlalchemy.engine import Connection, Engine
+
+from . import tables
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Decorator, register a schema migration
+
+    Migrations run in ascending version order and must be idempotent,
+    because SQLite commits DDL statements as soon as they are executed.
+
+    Parameters
+    ----------
+    version : int
+        Schema version reached after this migration, must be unique
+    description : str
+        Short description used in logs
+    """
+
+    def decorator(function: Callable[[Connection], None]):
+        assert version not in [i.version for i in MIGRATIONS]
+        MIGRATIONS.append(Migration(version, description, function))
+        MIGRATIONS.sort(key=lambda x: x.version)
+        return function
+
+    return decorator
+
+
+def latestVersion() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def readVersion(connection: Connection) -> int:
+    return connection.execute("PRAGMA user_version").scalar()
+
+
+def writeVersion(connection: Connection, version: int):
+    connection.execute(f"PRAGMA user_version = {int(version)}")
+
+
+def upgrade(engine: Engine, fresh: bool = False) -> int:
+    """Upgrade the database schema to the latest version
+
+    Parameters
+    ----------
+    engine : Engine
+        Database engine
+    fresh : bool, optional
+        The schema was just created from the current tables,
+        so only stamp the latest version, by default False
+
+    Returns
+    -------
+    int
+        Schema version after upgrading
+    """
+    with engine.connect() as connection:
+        if fresh:
+            writeVersion(connection, latestVersion())
+            return latestVersion()
+        version = readVersion(connection)
+        for perMigration in MIGRATIONS:
+            if perMigration.version <= version:
+                continue
+            logger.info(
+                f"Upgrading database schema to version {perMigration.version}: "
+                + perMigration.description
+            )
+            with connection.begin():
+                perMigration.upgrade(connection)
+                writeVersion(connection, perMigration.version)
+            version = perMigration.version
+    return version
+
+
+@migration(1, "composite (group, time) and (sender, time) indexes for records")
+def _(connection: Connection):
+    connection.execute(
+        'CREATE INDEX IF NOT EXISTS ix_records_group_time ON records ("group", time)'
+    )
+    connection.execute(
+        "CREATE INDEX IF NOT EXISTS ix_records_sender_time ON records (sender, time)"
+    )
+    connection.execute("DROP INDEX IF EXISTS ix_records_group")
+    connection.execute("DROP INDEX IF EXISTS ix_records_sender")
+
+
+@migration(2, "hourly message statistics backfilled from existing records")
+def _(connection: Connection):
+    connection.execute(tables.STATISTICS_CLEAR)
+    connection.execute(tables.STATISTICS_REBUILD)
+
+
+@migration(3, "content hash columns for users and groups")
+def _(connection: Connection):
+    for table in ("users", "groups"):
+        columns = [
+            i["name"] for i in connection.execute(f'PRAGMA table_info("{table}")')
+        ]
+        if "hash" not in columns:
+            connection.execute(f'ALTER TABLE "{table}" ADD COLUMN hash VARCHAR')
+
+
+@migration(4, "word frequencies counted as tokens and pairs, rebuilt after startup")
+def _(connection: Connection):
+    connection.execute(tables.ChatWords.__table__.delete())
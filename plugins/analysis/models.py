@@ -1,8 +1,8 @@
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from datetime import date, datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 
 from nonebot.typing import Context_T
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 
 class RecordsCreate(BaseModel):
@@ -10,6 +10,7 @@ class RecordsCreate(BaseModel):
     group: Optional[int] = None
     content: str
     ctx: Context_T
+    time: datetime = Field(default_factory=datetime.now)
 
 
 class RecordsRead(BaseModel):
@@ -21,6 +22,24 @@ class RecordsRead(BaseModel):
     ctx: Context_T
 
 
+class RecordsBrief(NamedTuple):
+    rid: int
+    time: datetime
+    content: str
+    sender: int
+    group: Optional[int]
+
+
+class Statistics(BaseModel):
+    scope: str
+    id: int
+    hour: datetime
+    count: int
+
+
+WordsFrequency_T = Dict[Tuple[str, int, date], Dict[str, int]]
+
+
 class Users(BaseModel):
     uid: int
     nickname: str
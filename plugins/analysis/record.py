@@ -1,55 +1,116 @@
 import asyncio
-from typing import Any, Dict, List
+from itertools import islice
+from threading import Lock
+from time import time
+from typing import Any, Dict, List, Optional
 
+from aiocqhttp.exceptions import ActionFailed
 from nonebot import NLPSession, get_bot, on_natural_language, scheduler
 from nonebot.command.argfilter.extractors import extract_text
 from nonebot.exceptions import CQHttpError
 from nonebot.log import logger
 
 from utils.decorators import SyncToAsync
-from utils.exception import ExceptionProcess
-from utils.objects import callModuleAPI
+from utils.manager import PluginManager
 
 from . import models
-from .access import RecordDAO
+from .access import STREAM_CHUNK_SIZE, RecordDAO
+from .chart.cloud import countRecordWords
+from .writer import RecordWriter
+
+__plugin_name__ = "analysis"
+
+PluginManager.registerPlugin(__plugin_name__)
 
 DatabaseIO = RecordDAO()
+RecordBuffer = RecordWriter(DatabaseIO)
+RecordBuffer.start()
 
 on_startup = get_bot().server_app.before_serving
+on_shutdown = get_bot().server_app.after_serving
 
 
-@scheduler.scheduled_job("interval", minutes=10)
-@SyncToAsync
-def saveDetail():
-    logger.info("Refreshing detail of users and groups.")
-    groupList: List[Dict[str, Any]] = callModuleAPI("get_group_list")
-    groupData: Dict[int, Dict[str, Any]] = {}
-    usersData: Dict[int, List[Dict[str, Any]]] = {}
-    for group in groupList:
-        groupID: int = group["group_id"]
-        groupName: str = group["group_name"]
-        data = callModuleAPI(
-            "get_group_member_list", params={"group_id": groupID}, ignoreError=True
-        )
+MEMBER_FETCH_CONCURRENCY = 8
+
+_REBUILD_LOCK = Lock()
+
+
+def _storeDetail(
+    groupList: List[Dict[str, Any]], membersList: List[Optional[List[Dict[str, Any]]]]
+):
+    groupsData: List[models.Groups] = []
+    usersData: Dict[int, Dict[int, Dict[str, Any]]] = {}
+    for group, data in zip(groupList, membersList):
         if not data:
             continue
-        groupData[groupID] = data
-        DatabaseIO.groupCreate(
-            models.Groups(gid=groupID, name=groupName, members=data), updateIfExist=True
-        )
+        groupID: int = group["group_id"]
+        groupName: str = group["group_name"]
+        groupsData.append(models.Groups(gid=groupID, name=groupName, members=data))
         for user in data:
-            userID: int = user["user_id"]
-            userGroups = usersData.get(userID, [])
-            for i in userGroups:
-                if i["group_id"] == groupID:
-                    userGroups.remove(i)
-            userGroups.append(user)
-            usersData[userID] = userGroups
-    for userID, user in usersData.items():
-        DatabaseIO.userCreate(
-            models.Users(uid=userID, nickname=user[0]["nickname"], data=user),
-            updateIfExist=True,
+            usersData.setdefault(user["user_id"], {})[groupID] = user
+    groupsChanged = DatabaseIO.groupUpsertBulk(groupsData)
+    usersList: List[models.Users] = []
+    for userID, userGroups in usersData.items():
+        userData = [*userGroups.values()]
+        usersList.append(
+            models.Users(uid=userID, nickname=userData[0]["nickname"], data=userData)
         )
+    usersChanged = DatabaseIO.userUpsertBulk(usersList)
+    logger.info(
+        f"Detail of {groupsChanged}/{len(groupsData)} groups "
+        + f"and {usersChanged}/{len(usersData)} users have been updated."
+    )
+
+
+@scheduler.scheduled_job("interval", minutes=10)
+async def saveDetail():
+    logger.info("Refreshing detail of users and groups.")
+    bot = get_bot()
+    groupList: List[Dict[str, Any]] = await bot.call_action("get_group_list")
+    semaphore = asyncio.Semaphore(MEMBER_FETCH_CONCURRENCY)
+
+    async def fetchMembers(groupID: int) -> Optional[List[Dict[str, Any]]]:
+        async with semaphore:
+            try:
+                return await bot.call_action("get_group_member_list", group_id=groupID)
+            except ActionFailed as e:
+                logger.debug(f"Failed to get member list of group {groupID}: {e}")
+                return None
+
+    startTime = time()
+    membersList = await asyncio.gather(
+        *[fetchMembers(group["group_id"]) for group in groupList]
+    )
+    logger.debug(
+        f"Member lists of {len(groupList)} groups have been fetched "
+        + f"in {time() - startTime:.3f}s."
+    )
+    await SyncToAsync(_storeDetail)(groupList, membersList)
+
+
+def rebuildWords() -> int:
+    """Rebuild daily word frequencies from all stored records
+
+    Returns
+    -------
+    int
+        Number of records counted
+    """
+    with _REBUILD_LOCK:
+        logger.info("Rebuilding word frequencies of chat records.")
+        RecordBuffer.flush()
+        stopRid, total = DatabaseIO.wordsClear(), 0
+        stream = DatabaseIO.recordStream()
+        while True:
+            chunk = [*islice(stream, STREAM_CHUNK_SIZE)]
+            if not chunk:
+                break
+            # Records after `stopRid` are counted by the writer
+            records = [i for i in chunk if i.rid <= stopRid]
+            DatabaseIO.wordsIncrease(countRecordWords(records))
+            total += len(records)
+    logger.info(f"Word frequencies of {total} chat records have been rebuilt.")
+    return total
 
 
 @on_startup
@@ -66,28 +127,38 @@ async def startupHook():
         logger.debug(f"Program API started successfully, account info: {info}")
         await saveDetail()
 
+    async def backfillWords():
+        # Databases created before word frequencies existed are filled once,
+        # in the background and page by page, so startup is not blocked
+        if await SyncToAsync(DatabaseIO.wordsMissing)():
+            await SyncToAsync(rebuildWords, executor=__plugin_name__)()
+
     get_bot().loop.create_task(wrapper())
+    get_bot().loop.create_task(backfillWords())
+
+
+@on_shutdown
+async def shutdownHook():
+    logger.info("Draining buffered chat records before shutdown.")
+    RecordBuffer.stop()
 
 
-@on_natural_language(
-    only_to_me=False, only_short_message=False, allow_empty_message=True
-)
 @SyncToAsync
-def recordChat(session: NLPSession):
+def _recordChat(session: NLPSession):
     content = extract_text(session.ctx["message"])
     ctx = session.ctx.copy()
     sender = session.ctx["user_id"]
     group = session.ctx.get("group_id")
     data = models.RecordsCreate(sender=sender, group=group, content=content, ctx=ctx)
 
-    try:
-        result = DatabaseIO.recordCreate(data)
-    except Exception as e:
-        traceID = ExceptionProcess.catch()
-        logger.warning(
-            f"Chat record {data} failed to storage due to {e} (Traceback ID:{traceID})."
-        )
-    else:
-        logger.debug(
-            f"Chat record {result} has been storaged to database successfully."
-        )
+    if not RecordBuffer.put(data):
+        logger.warning(f"Chat record {data} was dropped because the buffer is full.")
+
+
+@on_natural_language(
+    only_to_me=False, only_short_message=False, allow_empty_message=True
+)
+async def recordChat(session: NLPSession):
+    if not PluginManager.enabled(__plugin_name__, session.ctx):
+        return
+    await _recordChat(session)
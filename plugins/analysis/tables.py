@@ -1,7 +1,17 @@
 import json
 from datetime import datetime
 
-from sqlalchemy import Column, Float, ForeignKey, Integer, String, TypeDecorator
+from sqlalchemy import (
+    Column,
+    Date,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    TypeDecorator,
+    text,
+)
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -32,6 +42,7 @@ class Users(Base):
     uid = Column(Integer, primary_key=True)
     nickname = Column(String, index=True, nullable=False)
     data = Column(JsonIO, nullable=False)
+    hash = Column(String)
 
 
 class Groups(Base):
@@ -39,13 +50,81 @@ class Groups(Base):
     gid = Column(Integer, primary_key=True)
     name = Column(String, index=True, nullable=False)
     members = Column(JsonIO, nullable=False)
+    hash = Column(String)
 
 
 class ChatRecords(Base):
     __tablename__ = "records"
     rid = Column(Integer, primary_key=True)
-    sender = Column(Integer, ForeignKey("users.uid"), index=True, nullable=False)
-    group = Column(Integer, ForeignKey("groups.gid"), index=True)
+    sender = Column(Integer, ForeignKey("users.uid"), nullable=False)
+    group = Column(Integer, ForeignKey("groups.gid"))
     time = Column(DatetimeIO, index=True, nullable=False, default=datetime.now)
     content = Column(String, nullable=False)
     ctx = Column(JsonIO, nullable=False)
+
+    __table_args__ = (
+        Index("ix_records_group_time", "group", "time"),
+        Index("ix_records_sender_time", "sender", "time"),
+    )
+
+
+class ChatStatistics(Base):
+    __tablename__ = "record_statistics"
+    scope = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    hour = Column(DatetimeIO, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class ChatWords(Base):
+    __tablename__ = "record_words"
+    scope = Column(String, primary_key=True)
+    id = Column(Integer, primary_key=True)
+    date = Column(Date, primary_key=True)
+    word = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+_HOUR_BUCKET = (
+    "CAST(strftime('%s', strftime('%Y-%m-%d %H:00:00', time, 'unixepoch', "
+    + "'localtime'), 'utc') AS REAL)"
+)
+
+STATISTICS_INCREASE = text("""
+    INSERT INTO record_statistics (scope, id, hour, count)
+    VALUES (:scope, :id, :hour, :count)
+    ON CONFLICT (scope, id, hour) DO UPDATE SET count = count + excluded.count
+    """)
+
+STATISTICS_CLEAR = text("DELETE FROM record_statistics")
+
+STATISTICS_REBUILD = text(f"""
+    INSERT INTO record_statistics (scope, id, hour, count)
+    SELECT 'group', "group", {_HOUR_BUCKET} AS bucket, COUNT(*)
+    FROM records WHERE "group" IS NOT NULL GROUP BY "group", bucket
+    UNION ALL
+    SELECT 'user', sender, {_HOUR_BUCKET} AS bucket, COUNT(*)
+    FROM records GROUP BY sender, bucket
+    """)
+
+WORDS_INCREASE = text("""
+    INSERT INTO record_words (scope, id, date, word, count)
+    VALUES (:scope, :id, :date, :word, :count)
+    ON CONFLICT (scope, id, date, word) DO UPDATE SET count = count + excluded.count
+    """)
+
+USERS_UPSERT = text("""
+    INSERT INTO users (uid, nickname, data, hash)
+    VALUES (:uid, :nickname, :data, :hash)
+    ON CONFLICT (uid) DO UPDATE SET
+        nickname = excluded.nickname, data = excluded.data, hash = excluded.hash
+    WHERE users.hash IS NOT excluded.hash
+    """)
+
+GROUPS_UPSERT = text("""
+    INSERT INTO "groups" (gid, name, members, hash)
+    VALUES (:gid, :name, :members, :hash)
+    ON CONFLICT (gid) DO UPDATE SET
+        name = excluded.name, members = excluded.members, hash = excluded.hash
+    WHERE "groups".hash IS NOT excluded.hash
+    """)
@@ -0,0 +1,202 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from time import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from nonebot.log import logger
+
+from utils.exception import ExceptionProcess
+
+from . import models
+from .access import RecordDAO
+from .chart.cloud import countRecordWords
+
+FLUSH_SIZE = 200
+FLUSH_INTERVAL = 5
+MAX_BUFFER_SIZE = 5000
+PUT_TIMEOUT = 10
+MAX_ACTIVITY_SIZE = 10000
+
+
+class RecordWriter:
+    def __init__(
+        self,
+        dao: RecordDAO,
+        flushSize: int = FLUSH_SIZE,
+        flushInterval: float = FLUSH_INTERVAL,
+        maxSize: int = MAX_BUFFER_SIZE,
+    ):
+        """Write-behind buffer for chat records
+
+        Parameters
+        ----------
+        dao : RecordDAO
+            Database access object used to flush records
+        flushSize : int, optional
+            Flush as soon as this many records are buffered, by default 200
+        flushInterval : float, optional
+            Maximum seconds a record waits in the buffer, by default 5
+        maxSize : int, optional
+            Buffered and in-flight records allowed before `put` blocks,
+            by default 5000
+        """
+        assert 0 < flushSize <= maxSize
+        self._dao = dao
+        self._flushSize, self._flushInterval = flushSize, flushInterval
+        self._maxSize = maxSize
+        self._buffer: List[models.RecordsCreate] = []
+        self._inflight = 0
+        self._activity: "OrderedDict[Tuple[str, int], datetime]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._flushLock = threading.Lock()
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+        self._counters: Dict[str, Any] = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "flushes": 0,
+            "flush_time_total": 0.0,
+            "flush_time_last": 0.0,
+            "flush_time_max": 0.0,
+        }
+
+    def _pending(self) -> int:
+        return len(self._buffer) + self._inflight
+
+    def start(self):
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(
+            target=self._worker, name="RecordWriter", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the background worker and drain everything still buffered"""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def put(self, data: models.RecordsCreate, timeout: float = PUT_TIMEOUT) -> bool:
+        """Queue a record, blocking while the buffer is full
+
+        Returns
+        -------
+        bool
+            Whether the record was accepted before `timeout` expired
+        """
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self._pending() < self._maxSize, timeout=timeout
+            ):
+                self._counters["dropped"] += 1
+                return False
+            self._buffer.append(data)
+            self._counters["enqueued"] += 1
+            running = self._running
+            if len(self._buffer) >= self._flushSize:
+                self._condition.notify_all()
+        if not running:
+            self.flush()
+        return True
+
+    def lastActivity(self, type: str, id: int) -> Optional[datetime]:
+        """Time of the latest record of a chat written since startup,
+        `None` if the chat has not been active recently"""
+        with self._condition:
+            return self._activity.get((type, id))
+
+    def _touch(self, records: List[models.RecordsCreate]):
+        # Called with the condition held, after the records are readable
+        for data in records:
+            chats = [("user", data.sender)]
+            if data.group is not None:
+                chats.append(("group", data.group))
+            for chat in chats:
+                if chat not in self._activity or self._activity[chat] < data.time:
+                    self._activity[chat] = data.time
+                self._activity.move_to_end(chat)
+        while len(self._activity) > MAX_ACTIVITY_SIZE:
+            self._activity.popitem(last=False)
+
+    def flush(self) -> int:
+        """Write all buffered records in a single transaction
+
+        Returns
+        -------
+        int
+            Number of records written
+        """
+        with self._flushLock:
+            with self._condition:
+                pending, self._buffer = self._buffer, []
+                self._inflight = len(pending)
+            if not pending:
+                return 0
+            startTime = time()
+            try:
+                words = countRecordWords(pending)
+            except Exception as e:
+                words = {}
+                traceID = ExceptionProcess.catch()
+                logger.warning(
+                    f"Words of {len(pending)} chat records failed to count "
+                    + f"due to {e} (Traceback ID:{traceID})."
+                )
+            try:
+                written = self._dao.recordCreateBulk(pending, words=words)
+            except Exception as e:
+                written = 0
+                traceID = ExceptionProcess.catch()
+                logger.warning(
+                    f"{len(pending)} chat records failed to storage "
+                    + f"due to {e} (Traceback ID:{traceID})."
+                )
+            costTime = (time() - startTime) * 1000
+            with self._condition:
+                self._inflight = 0
+                if written:
+                    self._touch(pending)
+                self._counters["written"] += written
+                self._counters["failed"] += len(pending) - written
+                self._counters["flushes"] += 1
+                self._counters["flush_time_total"] += costTime
+                self._counters["flush_time_last"] = costTime
+                self._counters["flush_time_max"] = max(
+                    self._counters["flush_time_max"], costTime
+                )
+                self._condition.notify_all()
+        logger.debug(f"Flushed {written} chat records to database in {costTime:.3f}ms.")
+        return written
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: (not self._running) or len(self._buffer) >= self._flushSize,
+                    timeout=self._flushInterval,
+                )
+                running = self._running
+            self.flush()
+            if not running:
+                return
+
+    @property
+    def statistics(self) -> Dict[str, Any]:
+        with self._condition:
+            counters = self._counters.copy()
+            counters.update({"depth": len(self._buffer), "inflight": self._inflight})
+        flushes = counters["flushes"]
+        counters["flush_time_avg"] = (
+            counters["flush_time_total"] / flushes if flushes else 0.0
+        )
+        return counters
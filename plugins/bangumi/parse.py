@@ -1,8 +1,7 @@
 from typing import Any, Dict, List, Optional
 
-import requests
-
 from utils.decorators import CatchRequestsException
+from utils.network import NetworkUtils
 
 BASE_URL = "https://bangumi.moe"
 
@@ -15,7 +14,7 @@ class _baseRequest:
         params: Optional[Dict[str, str]] = {},
         headers: Optional[Dict[str, str]] = {},
     ) -> Any:
-        r = requests.get(url, params=params, headers=headers)
+        r = NetworkUtils.getSync(url, params=params, headers=headers, proxy=False)
         r.raise_for_status()
         return r.json()
 
@@ -27,7 +26,7 @@ class _baseRequest:
         headers: Optional[Dict[str, str]] = {},
     ) -> Any:
         headers["Accept"] = "application/json"
-        r = requests.post(url, json=data, headers=headers)
+        r = NetworkUtils.postSync(url, json=data, headers=headers, proxy=False)
         r.raise_for_status()
         return r.json()
 
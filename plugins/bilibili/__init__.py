@@ -9,7 +9,6 @@ from nonebot import (
 )
 from nonebot.permission import GROUP_ADMIN, SUPERUSER
 
-from utils.decorators import SyncToAsync
 from utils.manager import PluginManager
 from utils.message import processSession
 
@@ -28,10 +27,9 @@ PluginManager(__plugin_name__)
 
 @on_command("bilibili_info", aliases=("视频信息", "b站视频"))
 @processSession(pluginName=__plugin_name__)
-@SyncToAsync
-def vidInfo(session: CommandSession):
+async def vidInfo(session: CommandSession):
     aid = session.state["id"]
-    responseData = getVideoInfo(aid)
+    responseData = await getVideoInfo(aid)
     try:
         parsedData = BiliParser.parse(responseData)
     except Exception:
@@ -44,8 +42,7 @@ def vidInfo(session: CommandSession):
 
 @vidInfo.args_parser
 @processSession(pluginName=__plugin_name__)
-@SyncToAsync
-def _(session: CommandSession):
+async def _(session: CommandSession):
     if session.state.get("id", None):
         return
     args = session.current_arg_text.strip()
@@ -59,12 +56,7 @@ def _(session: CommandSession):
         session.pause("请输入正确的bv号或者av号")
 
 
-@on_natural_language(only_short_message=False, only_to_me=False)
-@SyncToAsync
-def _(session: NLPSession):
-    status = PluginManager.settings(__plugin_name__, session.ctx).status
-    if not status:
-        return
+def _parseVideoID(session: NLPSession):
     avResult = MATCH_AV.search(session.msg)
     bvResult = MATCH_BV.search(session.msg)
     if avResult:
@@ -81,17 +73,22 @@ def _(session: NLPSession):
         return
 
 
+@on_natural_language(only_short_message=False, only_to_me=False)
+async def _(session: NLPSession):
+    if not PluginManager.enabled(__plugin_name__, session.ctx):
+        return
+    return _parseVideoID(session)
+
+
 @on_command("bilibili_disable", aliases=("禁用视频信息", "关闭视频信息"), permission=POWER_GROUP)
 @processSession
-@SyncToAsync
-def _(session: CommandSession):
+async def _(session: CommandSession):
     PluginManager.settings(__plugin_name__, session.ctx).status = False
     return "视频信息捕捉已关闭"
 
 
 @on_command("bilibili_enable", aliases=("启用视频信息", "打开视频信息"), permission=POWER_GROUP)
 @processSession
-@SyncToAsync
-def _(session: CommandSession):
+async def _(session: CommandSession):
     PluginManager.settings(__plugin_name__, session.ctx).status = True
     return "视频信息捕捉已启用"
@@ -2,10 +2,10 @@ from datetime import datetime, timedelta
 from time import localtime, strftime
 from typing import Any, Dict, Union
 
-import requests
 from nonebot.message import MessageSegment
 
 from utils.decorators import CatchRequestsException
+from utils.network import NetworkUtils
 
 API_URL = "https://api.imjad.cn/bilibili/v2/"
 APIData_T = Dict[str, Any]
@@ -69,7 +69,7 @@ class BiliParser:
 
 
 @CatchRequestsException(retries=3, prompt="请求Bilibili接口失败")
-def getVideoInfo(aid: int) -> APIData_T:
-    r = requests.get(API_URL, params={"aid": aid})
+async def getVideoInfo(aid: int) -> APIData_T:
+    r = await NetworkUtils.get(API_URL, params={"aid": aid}, proxy=False)
     r.raise_for_status()
     return r.json()
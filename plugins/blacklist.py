@@ -41,10 +41,9 @@ def _(session: CommandSession):
     banID = [*set([int(i) for i in banID]).intersection({*groupUsers})]
     if not banID:
         session.pause("请输入被拉黑者的QQ")
-    nowBlacklist: list = PluginManager.settings(__plugin_name__, session.event).settings
-    nowBlacklist.extend(map(int, banID))
+    nowBlacklist = PluginManager.settings(__plugin_name__, session.event).settings
     PluginManager.settings(__plugin_name__, session.event).settings = [
-        *set(nowBlacklist)
+        *set(nowBlacklist).union(map(int, banID))
     ]
     return "已经为" + "".join(map(lambda x: str(MessageSegment.at(x)), banID)) + "添加黑名单"
 
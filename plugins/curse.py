@@ -1,4 +1,3 @@
-import requests
 from nonebot import CommandSession, on_command
 from nonebot.permission import GROUP_MEMBER, check_permission
 
@@ -9,12 +8,15 @@ from utils.decorators import (
     WithKeyword,
 )
 from utils.message import processSession
+from utils.network import NetworkUtils
 
 
 @CatchRequestsException(retries=3, prompt="嘴臭不出来了")
 def getCurseContent(min: bool = False):
-    r = requests.get(
-        "https://nmsl.shadiao.app/api.php", params=({"level": "min"} if min else {})
+    r = NetworkUtils.getSync(
+        "https://nmsl.shadiao.app/api.php",
+        params=({"level": "min"} if min else {}),
+        proxy=False,
     )
     r.raise_for_status()
     return "\u200b".join(r.text)
@@ -1,9 +1,12 @@
 from nonebot import CommandSession, on_command
 from nonebot.permission import SUPERUSER
 
-from utils.decorators import SyncToAsync, WithKeyword
+from utils.decorators import CircuitBreakers, SyncToAsync, WithKeyword
 from utils.exception import ExceptionProcess
-from utils.message import processSession
+from utils.executors import Executors
+from utils.imageCache import ImageCache
+from utils.message import LoginInfo, processSession
+from utils.metrics import Metrics
 
 
 @on_command("bug_catch", aliases=("追踪", "跟踪"), permission=SUPERUSER)
@@ -35,3 +38,66 @@ def _(session: CommandSession):
 @SyncToAsync
 def _(session: CommandSession):
     return "你好,在的", False
+
+
+@on_command("bot_status", aliases=("运行状态",), permission=SUPERUSER)
+@processSession
+@SyncToAsync
+def _(session: CommandSession):
+    return f"当前账号:{LoginInfo.userID}\n已过滤事件:{LoginInfo.filtered}个"
+
+
+@on_command("breaker_status", aliases=("熔断状态",), permission=SUPERUSER)
+@processSession
+@SyncToAsync
+def _(session: CommandSession):
+    status = CircuitBreakers.status
+    if not status:
+        return "尚未请求任何主机"
+    return "\n".join(
+        f"{host}:{i['state']},连续失败{i['failures']}次,拒绝{i['rejected']}次"
+        for host, i in status.items()
+    )
+
+
+@on_command("metrics", aliases=("性能统计",), permission=SUPERUSER)
+@processSession
+@SyncToAsync
+def _(session: CommandSession):
+    if not Metrics.enabled:
+        return "性能统计未开启"
+    status = sorted(
+        ((name, i) for name, i in Metrics.status.items() if i["count"]),
+        key=lambda x: x[1]["sum"],
+        reverse=True,
+    )
+    if not status:
+        return "暂无统计数据"
+    return "\n".join(
+        f"{name}:调用{i['count']}次,出错{i['errors']}次,"
+        + f"平均{i['sum'] / i['count'] * 1000:.1f}ms,"
+        + f"P95≤{Metrics.histogram(name).quantile(0.95) * 1000:.0f}ms"
+        for name, i in status[:10]
+    )
+
+
+@on_command("executor_status", aliases=("线程池状态",), permission=SUPERUSER)
+@processSession
+@SyncToAsync
+def _(session: CommandSession):
+    return "\n".join(
+        f"{name}:运行{i['active']}/{i['workers']},排队{i['queued']}/{i['max_queue']},"
+        + f"已完成{i['completed']},已拒绝{i['rejected']}"
+        for name, i in Executors.status.items()
+    )
+
+
+@on_command("image_cache_status", aliases=("图片缓存状态",), permission=SUPERUSER)
+@processSession
+@SyncToAsync
+def _(session: CommandSession):
+    status = ImageCache.statistics
+    return (
+        f"已缓存{status['entries']}张,共{status['size'] / 1024 ** 2:.1f}MiB\n"
+        + f"命中{status['hit']}次,未命中{status['miss']}次,淘汰{status['evicted']}张"
+    )
@@ -1,4 +1,3 @@
-from base64 import b64encode
 from datetime import date
 from itertools import cycle
 from os.path import isfile
@@ -6,7 +5,6 @@ from typing import Optional
 from urllib.parse import urljoin
 
 import apscheduler
-import requests
 from nonebot import CommandSession, MessageSegment, logger, on_command, scheduler
 from nonebot.permission import GROUP_ADMIN, GROUP_MEMBER, SUPERUSER
 from PIL import Image
@@ -14,8 +12,11 @@ from PIL import Image
 from utils.configsReader import configsReader, copyFileInText
 from utils.decorators import CatchRequestsException, SyncToAsync
 from utils.exception import ExceptionProcess
+from utils.imageCache import ImageCache
 from utils.manager import PluginManager
+from utils.mediaStore import MediaStore
 from utils.message import processSession
+from utils.network import NetworkUtils
 from utils.objects import callModuleAPI, convertImageFormat
 from utils.tmpFile import tmpFile
 
@@ -62,17 +63,28 @@ class daily:
 
         @CatchRequestsException
         def requestAPI():
-            dataGet = requests.get(CONFIG.api.image, params={"format": "js", "n": 10})
+            dataGet = NetworkUtils.getSync(
+                CONFIG.api.image, params={"format": "js", "n": 10}, proxy=False
+            )
             dataGet.raise_for_status()
             return dataGet.json()
 
         @CatchRequestsException(retries=3)
+        def downloadImage(imgLink: str):
+            dataGet = NetworkUtils.downloadSync(
+                urljoin("https://cn.bing.com/", imgLink),
+                timeout=(6, None),
+                proxy=False,
+                contentTypes=("image/",),
+            )
+            return convertImageFormat(resizeImage(dataGet, height=720))
+
         def getImage(imgLink: str):
-            dataGet = requests.get(
-                urljoin("https://cn.bing.com/", imgLink), timeout=(6, None)
+            return ImageCache.cached(
+                urljoin("https://cn.bing.com/", imgLink),
+                lambda: downloadImage(imgLink),
+                height=720,
             )
-            dataGet.raise_for_status()
-            return convertImageFormat(resizeImage(dataGet.content, height=720))
 
         if not _IMAGE_LIST_CACHE:
             _IMAGE_LIST_CACHE = cycle(requestAPI()["images"])
@@ -89,7 +101,7 @@ class daily:
     def hitokoto() -> dict:
         @CatchRequestsException(retries=3)
         def requestAPI():
-            dataGet = requests.get(CONFIG.api.hitokoto)
+            dataGet = NetworkUtils.getSync(CONFIG.api.hitokoto, proxy=False)
             dataGet.raise_for_status()
             return dataGet.json()
 
@@ -98,7 +110,7 @@ class daily:
 
 def timeTelling() -> str:
     imageData = daily.image()
-    imageEncoded = f'base64://{b64encode(imageData["image"]).decode()}'
+    imageEncoded = MediaStore.image(imageData["image"])
     hitokotoGet = daily.hitokoto()
     messageData = {
         "hitokoto": hitokotoGet["hitokoto"],
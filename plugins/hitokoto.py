@@ -1,13 +1,14 @@
 import os
 
-import requests
+import httpx
 from nonebot import CommandSession, on_command
 
 from utils.configsReader import configsReader, copyFileInText
-from utils.decorators import Async, WithKeyword
+from utils.decorators import WithKeyword
 from utils.exception import BotRequestError
 from utils.message import processSession
 from utils.manager import PluginManager
+from utils.network import NetworkUtils
 
 __plugin_name__ = "hitokoto"
 
@@ -25,12 +26,11 @@ PluginManager.registerPlugin(__plugin_name__)
 @on_command(__plugin_name__, aliases=("一言",))
 @processSession(pluginName=__plugin_name__)
 @WithKeyword(("一言哥", "来句一言"), __plugin_name__)
-@Async
-def hitokoto(session: CommandSession):
+async def hitokoto(session: CommandSession):
     try:
-        result = requests.get(CONFIG_READ.api_address)
+        result = await NetworkUtils.get(CONFIG_READ.api_address, proxy=False)
         result.raise_for_status()
         result = result.json()
-    except requests.RequestException:
+    except httpx.HTTPError:
         raise BotRequestError
     return str(CONFIG_READ.reply_format).format(**result), False
@@ -33,7 +33,7 @@ PluginManager.registerPlugin(OPERATING_METHOD)
 @on_command(GET_IMAGE_METHOD, aliases=("点图", "获取图片"))
 @processSession(pluginName=GET_IMAGE_METHOD)
 @WithKeyword("p站点图", command=GET_IMAGE_METHOD)
-@SyncToAsync
+@SyncToAsync(executor=__plugin_name__)
 def getImage(session: CommandSession):
     allowR18: bool = PluginManager.settings(GET_IMAGE_METHOD, ctx=session.ctx).settings[
         "r-18"
@@ -82,7 +82,7 @@ def _(session: CommandSession):
 @on_command(SEARCH_IMAGE_METHOD, aliases=("p站搜图", "搜索图片"))
 @processSession(pluginName=SEARCH_IMAGE_METHOD)
 @WithKeyword("p站搜图", command=SEARCH_IMAGE_METHOD)
-@SyncToAsync
+@SyncToAsync(executor=__plugin_name__)
 def searchImage(session: CommandSession):
     enableR18 = PluginManager.settings(SEARCH_IMAGE_METHOD, session.ctx).settings[
         "r-18"
@@ -124,7 +124,7 @@ def _(session: CommandSession):
 @on_command(MEMBER_IMAGE_METHOD, aliases=("p站画师", "画师", "搜索画师"))
 @processSession(pluginName=MEMBER_IMAGE_METHOD)
 @WithKeyword("p站画师", "搜索画师")
-@SyncToAsync
+@SyncToAsync(executor=__plugin_name__)
 def memberImage(session: CommandSession):
     memberID = session.get("id")
     enableR18 = PluginManager.settings(MEMBER_IMAGE_METHOD, session.ctx).settings[
@@ -162,7 +162,7 @@ def _(session: CommandSession):
 
 @on_command(RANK_IMAGE_METHOD, aliases=("一图",))
 @processSession(pluginName=RANK_IMAGE_METHOD)
-@SyncToAsync
+@SyncToAsync(executor=__plugin_name__)
 def _(session: CommandSession):
     session.send("开始获取一图")
     randomRank = random.choice(["day", "week", "month"])
@@ -1,33 +1,40 @@
-from base64 import b64encode
-from concurrent.futures.thread import ThreadPoolExecutor
 from datetime import date, timedelta
-from typing import Any, Dict, List, Optional, Union
+from functools import lru_cache
+from io import BytesIO
+from typing import IO, Any, Dict, List, Optional, Union
 
-import requests
 from PIL import Image, ImageDraw, ImageFilter, ImageFont
-from utils.botConfig import settings
 from utils.decorators import CatchRequestsException
 from utils.exception import BotRequestError
+from utils.executors import Executors
+from utils.imageCache import ImageCache
+from utils.mediaStore import MediaStore
 from utils.network import NetworkUtils
 from utils.objects import convertImageFormat
-from utils.tmpFile import tmpFile
 
 from .config import Config
 
-Executor = ThreadPoolExecutor(settings.THREAD_POOL_NUM)
+Executor = Executors.get("pixiv.download", 16)
 APIresult_T = Union[List[Dict[str, Any]], Dict[str, Any]]
+MOSAIC_MAX_SIZE = 800
 
 
 @CatchRequestsException(prompt="下载图片失败", retries=Config.apis.retries)
-def downloadImage(url: str, mosaic: Optional[bool] = False) -> str:
+def _downloadImage(url: str, mosaic: bool) -> bytes:
     headers = {"Referer": "https://www.pixiv.net"}
-    r = requests.get(url, headers=headers, timeout=(6, 12), proxies=NetworkUtils.proxy)
-    r.raise_for_status()
-    if mosaic:
-        pngImage = mosaicImage(r.content)
-    else:
-        pngImage = convertImageFormat(r.content)
-    return f"base64://{b64encode(pngImage).decode()}"
+    with NetworkUtils.downloadFileSync(
+        url, headers=headers, timeout=(6, 12), contentTypes=("image/",)
+    ) as file:
+        if mosaic:
+            return mosaicImage(file)
+        return convertImageFormat(file)
+
+
+def downloadImage(url: str, mosaic: Optional[bool] = False) -> str:
+    pngImage = ImageCache.cached(
+        url, lambda: _downloadImage(url, bool(mosaic)), mosaic=bool(mosaic)
+    )
+    return MediaStore.image(pngImage)
 
 
 def daybeforeYesterday():
@@ -37,43 +44,38 @@ def daybeforeYesterday():
     return yesterday.strftime("%Y-%m-%d")
 
 
+@lru_cache(maxsize=None)
+def _loadFont(font: str, fontSize: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font=font, size=fontSize)
+
+
 def textAlign(
-    img: bytes,
+    image: Image.Image,
     text: str,
     font: Optional[str] = "./data/font.otf",
     fontSize: Optional[int] = 100,
     fontColor: Optional[str] = "#FF0000",
-) -> bytes:
-    with tmpFile() as tf:
-        with open(tf, "wb") as f:
-            f.write(img)
-        with Image.open(tf) as im:
-            imageFont = ImageFont.truetype(font=font, size=fontSize)
-            imageWidth, imageHeight = im.size
-            textWidth, textHeight = imageFont.getsize(text)
-            imageDraw = ImageDraw.Draw(im)
-            textCoordinate = [
-                (imageWidth - textWidth) / 2,
-                (imageHeight - textHeight) / 2,
-            ]
-            imageDraw.text(xy=textCoordinate, text=text, fill=fontColor, font=imageFont)
-            im.save(tf, "PNG")
-        with open(tf, "rb") as f:
-            fileRead = f.read()
-    return fileRead
-
-
-def mosaicImage(img: bytes) -> bytes:
-    with tmpFile() as tf:
-        with open(tf, "wb") as f:
-            f.write(img)
-        with Image.open(tf) as im:
-            blured = im.filter(ImageFilter.GaussianBlur(radius=10))
-            blured.save(tf, "PNG")
-        with open(tf, "rb") as f:
-            fileRead = f.read()
-    imageWithText = textAlign(fileRead, "R-18")
-    return convertImageFormat(imageWithText)
+) -> Image.Image:
+    imageFont = _loadFont(font, fontSize)
+    imageWidth, imageHeight = image.size
+    textWidth, textHeight = imageFont.getsize(text)
+    imageDraw = ImageDraw.Draw(image)
+    textCoordinate = [
+        (imageWidth - textWidth) / 2,
+        (imageHeight - textHeight) / 2,
+    ]
+    imageDraw.text(xy=textCoordinate, text=text, fill=fontColor, font=imageFont)
+    return image
+
+
+def mosaicImage(img: Union[bytes, IO[bytes]]) -> bytes:
+    with Image.open(BytesIO(img) if isinstance(img, bytes) else img) as im:
+        # Let JPEG decode at a reduced scale, the blur hides the details anyway
+        im.draft("RGB", (MOSAIC_MAX_SIZE, MOSAIC_MAX_SIZE))
+        image = im.convert("RGB")
+    image.thumbnail((MOSAIC_MAX_SIZE, MOSAIC_MAX_SIZE), Image.BILINEAR)
+    blured = image.filter(ImageFilter.GaussianBlur(radius=10))
+    return convertImageFormat(textAlign(blured, "R-18"))
 
 
 def downloadMutliImage(
@@ -87,7 +89,9 @@ class pixiv:
     @staticmethod
     @CatchRequestsException(prompt="从Pixiv获取接口信息失败")
     def _baseGetJSON(params: Dict[str, str]) -> APIresult_T:
-        r = requests.get(Config.apis.address, params=params, timeout=3)
+        r = NetworkUtils.getSync(
+            Config.apis.address, params=params, timeout=3, proxy=False
+        )
         r.raise_for_status()
         resp: dict = r.json()
         if resp.get("error"):
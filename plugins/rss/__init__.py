@@ -5,7 +5,7 @@ from nonebot.permission import GROUP_ADMIN, PRIVATE_FRIEND, SUPERUSER
 
 from utils.decorators import SyncToAsync
 from utils.exception import BotExistError
-from utils.manager import PluginManager, nameJoin
+from utils.manager import PluginManager, nameJoin, thaw
 from utils.message import processSession
 
 from .config import CONFIG, __plugin_name__
@@ -34,7 +34,7 @@ def rssSubscribe(session: CommandSession):
     rssResourceParse: dict = rssParser(rssResource)
     # Check for duplicates with existing subscriptions
     subscribeToken = rssResourceParse["token"]
-    getSettings = PluginManager.settings(__plugin_name__, session.ctx).settings
+    getSettings = thaw(PluginManager.settings(__plugin_name__, session.ctx).settings)
     if getSettings["subscribed"].get(subscribeToken):
         raise BotExistError(reason="此订阅已存在!")
     else:
@@ -70,13 +70,13 @@ def _(session: CommandSession):
 
 
 @scheduler.scheduled_job("interval", minutes=CONFIG.refresh.time)
-@SyncToAsync
+@SyncToAsync(executor=__plugin_name__)
 def scheduledFeedRefresh():
     REFRESH_FEED.run()
 
 
 @on_command(TEST_COMMAND, aliases=("测试刷新订阅",), permission=SUPERUSER)
 @processSession
-@SyncToAsync
+@SyncToAsync(executor=__plugin_name__)
 def _(_: CommandSession):
     REFRESH_FEED.run()
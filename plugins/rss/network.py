@@ -1,12 +1,9 @@
-from concurrent.futures.thread import ThreadPoolExecutor
-from typing import List, Optional
+from typing import Iterator, List, Optional
 
-import requests
-
-from utils.botConfig import settings
 from utils.decorators import CatchRequestsException
 from utils.exception import BaseBotError
-from utils.manager import PluginManager
+from utils.executors import Executors
+from utils.manager import PluginManager, thaw
 from utils.network import NetworkUtils
 from utils.objects import callModuleAPI
 
@@ -16,14 +13,14 @@ from .parse import rssParser
 
 @CatchRequestsException(prompt="获取订阅流数据失败", retries=CONFIG.refresh.retries)
 def downloadFeed(url: str) -> str:
-    r = requests.get(url, proxies=NetworkUtils.proxy, timeout=6)
+    r = NetworkUtils.getSync(url, timeout=6)
     r.raise_for_status()
     return r.text.strip()
 
 
 class RefreshFeed:
-    def __init__(self, thread: Optional[int] = settings.THREAD_POOL_NUM):
-        self._executor = ThreadPoolExecutor(thread)
+    def __init__(self, thread: Optional[int] = None):
+        self._executor = Executors.get("rss.refresh", thread)
 
     def _getFeed(self, feedInfo: dict) -> dict:
         returnResult = feedInfo
@@ -34,6 +31,12 @@ class RefreshFeed:
             returnResult["exception"] = e
         return returnResult
 
+    def _getFeeds(self, feeds: List[dict]) -> Iterator[dict]:
+        # Submit in batches so that many subscriptions never overflow the queue
+        batchSize = self._executor.maxQueue
+        for i in range(0, len(feeds), batchSize):
+            yield from self._executor.map(self._getFeed, feeds[i : i + batchSize])
+
     def run(self):
         subscribedFeeds: List[dict] = []
         friendList: List[int] = [i["user_id"] for i in callModuleAPI("get_friend_list")]
@@ -73,7 +76,7 @@ class RefreshFeed:
                     }
                 )
 
-        for perFeed in self._executor.map(self._getFeed, subscribedFeeds):
+        for perFeed in self._getFeeds(subscribedFeeds):
             feedData: dict = perFeed.get("data")
             if not feedData:
                 continue
@@ -84,9 +87,11 @@ class RefreshFeed:
                 for i in feedData["content"]
                 if i["published_stamp"] > perFeed["last_update"]
             ]
-            feedSettings: dict = PluginManager._getSettings(
-                pluginName=__plugin_name__, type=perFeed["type"], id=perFeed["id"]
-            ).settings
+            feedSettings: dict = thaw(
+                PluginManager._getSettings(
+                    pluginName=__plugin_name__, type=perFeed["type"], id=perFeed["id"]
+                ).settings
+            )
             feedSettings.update(
                 {
                     perFeed["token"]: {
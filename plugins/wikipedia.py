@@ -1,10 +1,9 @@
 import os
 
-import requests
 from nonebot import CommandSession, on_command
 
 from utils.configsReader import configsReader, copyFileInText
-from utils.decorators import CatchRequestsException, SyncToAsync
+from utils.decorators import CatchRequestsException
 from utils.message import processSession
 from utils.network import NetworkUtils
 from utils.manager import PluginManager
@@ -23,7 +22,7 @@ CONFIG_READ = Config = configsReader(CONFIG_PATH, DEFAULT_PATH)
 
 
 @CatchRequestsException(prompt="从维基获取数据出错")
-def getWiki(keyword: str) -> dict:
+async def getWiki(keyword: str) -> dict:
     requestParam = {
         "action": "query",
         "generator": "prefixsearch",
@@ -35,20 +34,20 @@ def getWiki(keyword: str) -> dict:
         "explaintext": "1",
         "uselang": "zh-hans",
     }
-    result = requests.get(
-        CONFIG_READ.apis.wiki, params=requestParam, proxies=NetworkUtils.proxy
-    )
+    result = await NetworkUtils.get(CONFIG_READ.apis.wiki, params=requestParam)
     result.raise_for_status()
     return result.json()
 
 
 @on_command(__plugin_name__, aliases=("维基搜索", "维基"))
 @processSession(pluginName=__plugin_name__)
-@SyncToAsync
-def wikipedia(session: CommandSession):
+async def wikipedia(session: CommandSession):
     keyword = session.get("keyword")
-    session.send(f"开始Wiki搜索:{keyword}")
-    pages = getWiki(keyword)["query"]["pages"]
+    await session.send(f"开始Wiki搜索:{keyword}")
+    pages = (await getWiki(keyword))["query"]["pages"]
+    shortLinks = await NetworkUtils.shortLinkAsync(
+        [page["fullurl"] for page in pages.values()]
+    )
     finalResult = {"keyword": keyword, "size": len(pages)}
     finalResult["result"] = []
     for page in pages.values():
@@ -56,7 +55,7 @@ def wikipedia(session: CommandSession):
             {
                 "title": page["title"],
                 "introduce": page["extract"],
-                "link": NetworkUtils.shortLink([page["fullurl"]])[page["fullurl"]],
+                "link": shortLinks[page["fullurl"]],
             }
         )
     repeatMessage = [
@@ -73,8 +72,7 @@ def wikipedia(session: CommandSession):
 
 @wikipedia.args_parser
 @processSession
-@SyncToAsync
-def _(session: CommandSession):
+async def _(session: CommandSession):
     strippedArgs = session.current_arg_text.strip()
     if not strippedArgs:
         session.pause("请输入搜索关键词")
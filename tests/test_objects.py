@@ -0,0 +1,38 @@
+from io import BytesIO
+from unittest import mock
+
+from PIL import Image
+
+from utils import objects
+
+
+def _encodedImage(format: str = "PNG") -> bytes:
+    with BytesIO() as buffer:
+        Image.new("RGB", (64, 64), (255, 0, 0)).save(buffer, format)
+        return buffer.getvalue()
+
+
+def setup_function():
+    objects.checkImageFormat.cache_clear()
+
+
+def teardown_function():
+    objects.checkImageFormat.cache_clear()
+
+
+def test_supported_format_is_kept():
+    assert objects.checkImageFormat("png") == "PNG"
+    assert objects.checkImageFormat("JPEG") == "JPEG"
+
+
+def test_unknown_format_falls_back():
+    assert objects.checkImageFormat("BMP") == objects.FALLBACK_FORMAT
+
+
+def test_webp_without_libwebp_falls_back():
+    with mock.patch.object(objects.features, "check", return_value=False):
+        assert objects.checkImageFormat("WEBP") == objects.FALLBACK_FORMAT
+        converted = objects.convertImageFormat(_encodedImage(), format="WEBP")
+    assert objects.imageExtension(converted) == "jpg"
+    with Image.open(BytesIO(converted)) as image:
+        assert image.format == "JPEG"
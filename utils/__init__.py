@@ -12,10 +12,13 @@ def _initUtils():
 
 def _utilsConfigReader() -> Any:
     from .configsReader import configsReader, copyFileInText
+    from .objects import checkImageFormat
 
     if not os.path.isfile(UTILS_CONFIG_DIR):
         copyFileInText(UTILS_DEFAULT_DIR, UTILS_CONFIG_DIR)
-    return configsReader(UTILS_CONFIG_DIR, UTILS_DEFAULT_DIR)
+    config = configsReader(UTILS_CONFIG_DIR, UTILS_DEFAULT_DIR)
+    config.image["format"] = checkImageFormat(config.image["format"])
+    return config
 
 
 _initUtils()
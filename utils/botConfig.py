@@ -119,3 +119,12 @@ class settings:
     DATABASE_DEBUG = CONFIG_READ.get("database_debug", False)
 
     THREAD_POOL_NUM = CONFIG_READ.get("thread_pool_num", 16)
+    PROCESS_POOL_NUM = CONFIG_READ.get("process_pool_num", 2)
+    PLUGIN_POOL_NUM = CONFIG_READ.get("plugin_pool_num", 8)
+    THREAD_POOL_QUEUE = CONFIG_READ.get("thread_pool_queue", 256)
+    THREAD_POOLS = CONFIG_READ.get("thread_pools") or {}
+
+    SETTINGS_BACKEND = CONFIG_READ.get("settings_backend", "json")
+
+    METRICS_ENABLE = CONFIG_READ.get("metrics_enable", True)
+    METRICS_ENDPOINT = CONFIG_READ.get("metrics_endpoint", None)
@@ -0,0 +1,66 @@
+from io import BytesIO
+from typing import Dict, Optional
+
+import seaborn as sns
+from matplotlib import pyplot
+from pandas import DataFrame
+from wordcloud import WordCloud
+
+from .decorators import ProcessInitializer, SyncToProcess
+from .objects import convertImageFormat
+
+FONT_PATH = "./data/font.otf"
+
+_WORDCLOUD: Optional[WordCloud] = None
+
+
+def _getWordcloud() -> WordCloud:
+    """Word cloud renderer of current process, built once with its font"""
+    global _WORDCLOUD
+    if _WORDCLOUD is None:
+        _WORDCLOUD = WordCloud(
+            font_path=FONT_PATH, width=1920, height=1080, background_color="white"
+        )
+    return _WORDCLOUD
+
+
+class Chart:
+    @staticmethod
+    def _toImage(grid: sns.FacetGrid) -> bytes:
+        with BytesIO() as buffer:
+            grid.savefig(buffer, format="png")
+            pyplot.close(grid.fig)
+            buffer.seek(0)
+            return convertImageFormat(buffer)
+
+    @classmethod
+    def chatFrequency(cls, data: DataFrame):
+        assert "date" in data
+        assert "hour" in data
+        assert "count" in data
+        grid = sns.FacetGrid(data=data, row="date", aspect=2)
+        grid.map_dataframe(
+            sns.histplot,
+            x="hour",
+            weights="count",
+            bins=24,
+            binrange=(0, 24),
+            kde=True,
+        )
+        return cls._toImage(grid)
+
+
+@ProcessInitializer
+def _initRenderer():
+    _getWordcloud()
+
+
+@SyncToProcess
+def renderWordcloud(frequency: Dict[str, int]) -> bytes:
+    image = _getWordcloud().generate_from_frequencies(frequency).to_image()
+    return convertImageFormat(image)
+
+
+@SyncToProcess
+def renderChatFrequency(data: DataFrame) -> bytes:
+    return Chart.chatFrequency(data)
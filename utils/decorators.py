@@ -1,20 +1,39 @@
-from asyncio import run_coroutine_threadsafe
+from asyncio import iscoroutinefunction, run_coroutine_threadsafe
+from asyncio import sleep as asyncSleep
 from concurrent.futures import Future
-from concurrent.futures.thread import ThreadPoolExecutor
+from concurrent.futures.process import ProcessPoolExecutor
 from functools import partial, wraps
+from importlib import import_module
 from inspect import isawaitable
-from time import time
-from typing import Awaitable, Callable, Optional, Union
+from multiprocessing import get_context
+from random import uniform
+from threading import Lock
+from time import perf_counter, sleep, time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
 
+import httpx
 from nonebot import IntentCommand, get_bot, logger, on_natural_language
+from nonebot.command import SwitchException, _FinishException, _PauseException
 from requests import HTTPError, RequestException
 
 from .botConfig import settings
 from .exception import BotRequestError, ExceptionProcess
+from .executors import Executors
+from .metrics import Metrics
 
-_EXECUTOR = ThreadPoolExecutor(
-    settings.THREAD_POOL_NUM, thread_name_prefix="BotThreadPool"
-)
+_EXECUTOR = Executors.get("default", settings.THREAD_POOL_NUM)
+_PROCESS_EXECUTOR: Optional[ProcessPoolExecutor] = None
+_PROCESS_EXECUTOR_LOCK = Lock()
+_PROCESS_INITIALIZERS: List[Callable[[], Any]] = []
+
+_CONTROL_EXCEPTIONS = (_FinishException, _PauseException, SwitchException)
+
+RETRY_BACKOFF = 0.5
+RETRY_MAX_BACKOFF = 8.0
+RETRY_BUDGET_RATIO = 0.2
+RETRY_BUDGET_MAX = 10.0
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_RESET_TIMEOUT = 30.0
 
 
 def _getFunctionName(function: Callable) -> str:
@@ -26,34 +45,86 @@ def _getFunctionName(function: Callable) -> str:
         return function.__repr__()
 
 
-def Timeit(function: Callable):
-    """Decorator for timing a function"""
+def Timeit(function: Callable = None, *, name: Optional[str] = None):
+    """Decorator for timing a function, coroutine functions are awaited
+
+    Latency, calls and errors are recorded in the histogram of `Metrics`
+    named after the function, nothing is wrapped if metrics are disabled.
+    Control flow exceptions of sessions, such as `session.finish`,
+    are not counted as errors.
+
+    Parameters
+    ----------
+    name : Optional[str], optional
+        Name of the histogram, by default the module and name of the function
+    """
+    if function is None:
+        return partial(Timeit, name=name)
+
     assert callable(function)
+    if not Metrics.enabled:
+        return function
+    histogram = Metrics.histogram(
+        name or f"{getattr(function, '__module__', None)}.{_getFunctionName(function)}"
+    )
+
+    if iscoroutinefunction(function):
+
+        @wraps(function)
+        async def asyncWrapper(*args, **kwargs):
+            startTime, error = perf_counter(), True
+            try:
+                result = await function(*args, **kwargs)
+                error = False
+                return result
+            except _CONTROL_EXCEPTIONS:
+                error = False
+                raise
+            finally:
+                histogram.observe(perf_counter() - startTime, error)
+
+        return asyncWrapper
 
     @wraps(function)
     def wrapper(*args, **kwargs):
-        functionName = _getFunctionName(function)
-        startTime = time() * 1000
+        startTime, error = perf_counter(), True
         try:
-            return function(*args, **kwargs)
+            result = function(*args, **kwargs)
+            error = False
+            return result
+        except _CONTROL_EXCEPTIONS:
+            error = False
+            raise
         finally:
-            runningCost = (time() * 1000) - startTime
-            logger.debug(
-                f"Function {functionName} cost {runningCost:.3f}ms."
-                + f"args={str(args):.100s}...,kwargs={str(kwargs):.100s}..."
-            )
+            histogram.observe(perf_counter() - startTime, error)
 
     return wrapper
 
 
-def SyncToAsync(function: Callable):
-    """Decorator to convert synchronous functions to asynchronous functions"""
+def SyncToAsync(function: Callable = None, *, executor: Optional[str] = None):
+    """Decorator to convert synchronous functions to asynchronous functions
+
+    Parameters
+    ----------
+    executor : Optional[str], optional
+        Name of the thread pool in `Executors` to run in,
+        by default the shared one
+
+    Raises
+    ------
+    BotBusyError
+        When called, if the queue of the thread pool is full
+    """
+    if function is None:
+        return partial(SyncToAsync, executor=executor)
+
     function = Timeit(function)
+    pool = Executors.get(executor) if executor else _EXECUTOR
 
     @wraps(function)
     def wrapper(*args, **kwargs):
         runner: Callable = lambda: function(*args, **kwargs)
-        return get_bot().loop.run_in_executor(_EXECUTOR, runner)
+        return get_bot().loop.run_in_executor(pool, runner)
 
     return wrapper
 
@@ -73,6 +144,65 @@ def AsyncToSync(function: Callable):
     return wrapper
 
 
+def ProcessInitializer(function: Callable[[], Any]):
+    """Decorator, run a function once in every worker of the process pool
+
+    Must be applied at import time, before anything is submitted to the pool.
+    """
+    assert callable(function)
+    _PROCESS_INITIALIZERS.append(function)
+    return function
+
+
+def _initializeProcess(initializers: Tuple[Callable[[], Any], ...]):
+    for function in initializers:
+        function()
+
+
+def _getProcessExecutor() -> ProcessPoolExecutor:
+    global _PROCESS_EXECUTOR
+    with _PROCESS_EXECUTOR_LOCK:
+        if _PROCESS_EXECUTOR is None:
+            # Workers are spawned rather than forked, a forked child could
+            # inherit locks held by the threads of the bot and deadlock
+            _PROCESS_EXECUTOR = ProcessPoolExecutor(
+                settings.PROCESS_POOL_NUM,
+                mp_context=get_context("spawn"),
+                initializer=_initializeProcess,
+                initargs=(tuple(_PROCESS_INITIALIZERS),),
+            )
+    return _PROCESS_EXECUTOR
+
+
+def _runInProcess(
+    moduleName: str, functionName: str, args: tuple, kwargs: Dict[str, Any]
+) -> Any:
+    function: Any = import_module(moduleName)
+    for name in functionName.split("."):
+        function = getattr(function, name)
+    return function.__process_target__(*args, **kwargs)
+
+
+def SyncToProcess(function: Callable):
+    """Decorator to run CPU-bound synchronous functions in the process pool
+    and convert them to asynchronous functions
+
+    The function must be defined at module level, in a module which
+    can be imported without an initialized bot, so plugins keep them in `utils`.
+    Its arguments and return value must be picklable.
+    """
+    moduleName, functionName = function.__module__, _getFunctionName(function)
+    assert "<locals>" not in functionName
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        runner = partial(_runInProcess, moduleName, functionName, args, kwargs)
+        return get_bot().loop.run_in_executor(_getProcessExecutor(), runner)
+
+    wrapper.__process_target__ = function
+    return wrapper
+
+
 Async = SyncToAsync
 Sync = AsyncToSync
 
@@ -101,22 +231,155 @@ def WithKeyword(
         async def _(session):
             return IntentCommand(float(confidence), command)
 
-        @wraps(function)
-        def wrapper(*args, **kwargs):
-            return function(*args, **kwargs)
-
-        return wrapper
+        return function
 
     return decorator
 
 
+class CircuitOpenError(httpx.HTTPError):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+    def __init__(self, host: str):
+        self.host = host
+        super().__init__(f"Circuit breaker of host {host} is open")
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        failureThreshold: int = BREAKER_FAILURE_THRESHOLD,
+        resetTimeout: float = BREAKER_RESET_TIMEOUT,
+    ):
+        """Circuit breaker of a single host
+
+        Parameters
+        ----------
+        failureThreshold : int, optional
+            Consecutive failures before the circuit opens, by default 5
+        resetTimeout : float, optional
+            Seconds before an open circuit lets one trial request through,
+            by default 30
+        """
+        self.failureThreshold, self.resetTimeout = failureThreshold, resetTimeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.openedTime = 0.0
+        self._trial = False
+        self._lock = Lock()
+        self.counters = {"success": 0, "failure": 0, "rejected": 0}
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now"""
+        with self._lock:
+            if (
+                self.state == self.OPEN
+                and time() - self.openedTime >= self.resetTimeout
+            ):
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+            self.counters["rejected"] += 1
+            return False
+
+    def success(self):
+        with self._lock:
+            self.counters["success"] += 1
+            self.state, self.failures, self._trial = self.CLOSED, 0, False
+
+    def failure(self):
+        with self._lock:
+            self.counters["failure"] += 1
+            self.failures += 1
+            self._trial = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failureThreshold:
+                self.state, self.openedTime = self.OPEN, time()
+
+    def release(self):
+        """Finish an allowed request without judging the host"""
+        with self._lock:
+            self._trial = False
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "opened_time": self.openedTime,
+                **self.counters,
+            }
+
+
+class _CircuitBreakers:
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = Lock()
+
+    def __getitem__(self, host: str) -> CircuitBreaker:
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker()
+            return self._breakers[host]
+
+    @property
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = self._breakers.copy()
+        return {host: breaker.status for host, breaker in sorted(breakers.items())}
+
+
+CircuitBreakers = _CircuitBreakers()
+
+
+class _RetryBudget:
+    def __init__(
+        self, ratio: float = RETRY_BUDGET_RATIO, maxTokens: float = RETRY_BUDGET_MAX
+    ):
+        """Token bucket limiting retries to a ratio of calls
+
+        Every call deposits `ratio` tokens and every retry withdraws one,
+        so a failing dependency cannot multiply the load on it.
+        """
+        self.ratio, self.maxTokens = ratio, maxTokens
+        self._tokens = maxTokens
+        self._lock = Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.maxTokens, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+def _backoffDelay(attempt: int, backoff: float, maxBackoff: float) -> float:
+    """Exponential backoff with full jitter"""
+    return uniform(0, min(maxBackoff, backoff * 2 ** (attempt - 1)))
+
+
 def CatchRequestsException(
     function: Callable = None,
     *,
     prompt: Optional[str] = None,
     retries: Optional[int] = None,
+    backoff: float = RETRY_BACKOFF,
+    maxBackoff: float = RETRY_MAX_BACKOFF,
 ):
-    """Decorator, catch exceptions from `requests` library
+    """Decorator, catch exceptions from `requests` and `httpx` library
+
+    Attempts are spaced by exponential backoff with jitter,
+    and retries are limited by a budget shared by all calls of the function.
+    Errors which retrying cannot fix, such as bad status codes
+    or an open circuit breaker, are raised at once.
 
     Parameters
     ----------
@@ -124,6 +387,10 @@ def CatchRequestsException(
         Prompt for error, do not prompt if empty, by default None
     retries : int, optional
         number of retries, by default 1
+    backoff : float, optional
+        Base seconds of the backoff, by default 0.5
+    maxBackoff : float, optional
+        Maximum seconds of the backoff, by default 8
 
     Raises
     ------
@@ -131,24 +398,58 @@ def CatchRequestsException(
         An exception was thrown after the robot network request was caught.
     """
     if function is None:
-        return partial(CatchRequestsException, prompt=prompt, retries=retries)
+        return partial(
+            CatchRequestsException,
+            prompt=prompt,
+            retries=retries,
+            backoff=backoff,
+            maxBackoff=maxBackoff,
+        )
 
     functionName = _getFunctionName(function)
     function = Timeit(function)
+    budget = _RetryBudget()
+    fatalErrors = (HTTPError, httpx.HTTPStatusError, CircuitOpenError)
+
+    def nextDelay(attempt: int, error: Exception) -> Optional[float]:
+        traceID = ExceptionProcess.catch()
+        logger.debug(
+            f"Function {functionName} encountered"
+            + f'a network request error: "{error}"'
+        )
+        if isinstance(error, fatalErrors) or attempt >= (retries or 1):
+            raise BotRequestError(prompt, traceID)
+        if not budget.withdraw():
+            logger.debug(f"Retry budget of function {functionName} is exhausted.")
+            raise BotRequestError(prompt, traceID)
+        return _backoffDelay(attempt, backoff, maxBackoff)
+
+    if iscoroutinefunction(function):
+
+        @wraps(function)
+        async def asyncWrapper(*args, **kwargs):
+            budget.deposit()
+            attempt = 0
+            while True:
+                attempt += 1
+                try:
+                    return await function(*args, **kwargs)
+                except httpx.HTTPError as error:
+                    delay = nextDelay(attempt, error)
+                await asyncSleep(delay)
+
+        return asyncWrapper
 
     @wraps(function)
     def wrapper(*args, **kwargs):
-        for _ in range(retries if retries else 1):
+        budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
             try:
                 return function(*args, **kwargs)
-            except RequestException as error:
-                traceID = ExceptionProcess.catch()
-                logger.debug(
-                    f"Function {functionName} encountered"
-                    + f'a network request error: "{error}"'
-                )
-                if isinstance(error, HTTPError):
-                    break
-        raise BotRequestError(prompt, traceID)
+            except (RequestException, httpx.HTTPError) as error:
+                delay = nextDelay(attempt, error)
+            sleep(delay)
 
     return wrapper
@@ -44,6 +44,10 @@ class BotDisabledError(BotProgramError):
     pass
 
 
+class BotBusyError(BotProgramError):
+    pass
+
+
 class BotRequestError(BotNetworkError):
     pass
 
@@ -0,0 +1,155 @@
+from concurrent.futures import Future
+from concurrent.futures.thread import ThreadPoolExecutor
+from threading import Lock
+from time import perf_counter
+from typing import Any, Callable, Dict, List, Optional
+
+from .botConfig import settings
+from .exception import BotBusyError
+from .metrics import Histogram, Metrics, renderHistograms, renderValues
+
+
+class BoundedExecutor(ThreadPoolExecutor):
+    def __init__(self, name: str, maxWorkers: int, maxQueue: int):
+        """Thread pool rejecting new work once too many tasks are waiting
+
+        Parameters
+        ----------
+        name : str
+            Name of the pool, used in thread names and metrics
+        maxWorkers : int
+            Number of threads
+        maxQueue : int
+            Maximum number of submitted tasks not yet running
+
+        Raises
+        ------
+        BotBusyError
+            From `submit` and `map`, when the queue is full
+        """
+        super().__init__(maxWorkers, thread_name_prefix=f"BotThreadPool-{name}")
+        self.name, self.maxWorkers, self.maxQueue = name, maxWorkers, maxQueue
+        self.waitTime = Histogram()
+        self._statusLock = Lock()
+        self._queued, self._active = 0, 0
+        self._completed, self._rejected = 0, 0
+
+    def _dequeue(self, future: Future):
+        if future.cancelled():
+            with self._statusLock:
+                self._queued -= 1
+
+    def submit(self, function: Callable, *args, **kwargs) -> Future:
+        with self._statusLock:
+            if self._queued >= self.maxQueue:
+                self._rejected += 1
+                raise BotBusyError(f"任务队列{self.name}已满,请稍后再试")
+            self._queued += 1
+        submitTime = perf_counter()
+
+        def runner():
+            with self._statusLock:
+                self._queued -= 1
+                self._active += 1
+            self.waitTime.observe(perf_counter() - submitTime)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                with self._statusLock:
+                    self._active -= 1
+                    self._completed += 1
+
+        try:
+            future = super().submit(runner)
+        except BaseException:
+            with self._statusLock:
+                self._queued -= 1
+            raise
+        future.add_done_callback(self._dequeue)
+        return future
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        with self._statusLock:
+            status = {
+                "workers": self.maxWorkers,
+                "active": self._active,
+                "queued": self._queued,
+                "max_queue": self.maxQueue,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+        status["wait_time"] = self.waitTime.status
+        return status
+
+
+class _ExecutorRegistry:
+    def __init__(self):
+        self._executors: Dict[str, BoundedExecutor] = {}
+        self._lock = Lock()
+        Metrics.registerCollector(self._collect)
+
+    def get(self, name: str, maxWorkers: Optional[int] = None) -> BoundedExecutor:
+        """Get the thread pool of `name`, created if it does not exist
+
+        Parameters
+        ----------
+        name : str
+            Name of the pool, usually the name of a plugin
+        maxWorkers : Optional[int], optional
+            Threads of a new pool, overridden by `thread_pools` in configuration
+            file, by default `plugin_pool_num` in configuration file
+        """
+        with self._lock:
+            if name not in self._executors:
+                self._executors[name] = BoundedExecutor(
+                    name,
+                    settings.THREAD_POOLS.get(
+                        name, maxWorkers or settings.PLUGIN_POOL_NUM
+                    ),
+                    settings.THREAD_POOL_QUEUE,
+                )
+            return self._executors[name]
+
+    __getitem__ = get
+
+    @property
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            executors = self._executors.copy()
+        return {name: i.status for name, i in sorted(executors.items())}
+
+    def _collect(self) -> List[str]:
+        status = self.status
+        return (
+            renderHistograms(
+                "bot_executor_queue_wait_seconds",
+                "Time tasks waited in the queue of a thread pool.",
+                "executor",
+                {name: i["wait_time"] for name, i in status.items()},
+            )
+            + renderValues(
+                "bot_executor_active_threads",
+                "gauge",
+                "Threads of a thread pool running a task.",
+                "executor",
+                {name: i["active"] for name, i in status.items()},
+            )
+            + renderValues(
+                "bot_executor_queued_tasks",
+                "gauge",
+                "Tasks waiting in the queue of a thread pool.",
+                "executor",
+                {name: i["queued"] for name, i in status.items()},
+            )
+            + renderValues(
+                "bot_executor_rejected_total",
+                "counter",
+                "Tasks rejected because the queue of a thread pool was full.",
+                "executor",
+                {name: i["rejected"] for name, i in status.items()},
+            )
+        )
+
+
+Executors = _ExecutorRegistry()
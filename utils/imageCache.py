@@ -0,0 +1,153 @@
+import json
+import os
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+from time import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from nonebot.log import logger
+
+from . import UtilsConfig
+from .objects import renewImageNoise
+
+IMAGE_CACHE_DIR = "./data/imageCache"
+
+
+class _ImageCache:
+    def __init__(self, cacheDir: str = IMAGE_CACHE_DIR):
+        """Disk cache of processed images with LRU eviction and expiration
+
+        Images are addressed by the hash of their source address,
+        the transform applied to them and the image settings,
+        the size cap and lifetime are read from the configuration file.
+        """
+        self.configObject = UtilsConfig.image
+        self._maxSize = self.configObject["cache_size"] * 1024 ** 2
+        self._ttl = self.configObject["cache_ttl"]
+        os.makedirs(cacheDir, exist_ok=True)
+        self._dir = cacheDir
+        self._lock = Lock()
+        self._entries: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._producing: Dict[str, Lock] = {}
+        self._counters = {"hit": 0, "miss": 0, "evicted": 0}
+        files = [i for i in os.scandir(cacheDir) if i.is_file() and i.name.isalnum()]
+        for entry in sorted(files, key=lambda x: x.stat().st_mtime):
+            stat = entry.stat()
+            self._entries[entry.name] = (stat.st_size, stat.st_mtime)
+        self._evict()
+
+    def key(self, url: str, **transform: Any) -> str:
+        """Build the cache key of the image from `url` processed by `transform`"""
+        settings = {
+            k: v
+            for k, v in self.configObject.items()
+            if k in ("format", "quality", "min_quality")
+        }
+        source = json.dumps([url, transform, settings], sort_keys=True, default=str)
+        return sha256(source.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._dir, key)
+
+    def _remove(self, key: str):
+        self._entries.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        deadline = time() - self._ttl
+        totalSize = 0
+        for key, (size, createdTime) in list(self._entries.items()):
+            if createdTime < deadline:
+                self._remove(key)
+            else:
+                totalSize += size
+        while self._entries and totalSize > self._maxSize:
+            key, (size, _) = next(iter(self._entries.items()))
+            totalSize -= size
+            self._remove(key)
+            self._counters["evicted"] += 1
+            logger.debug(f"Image {key} has been evicted from cache.")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            _, createdTime = self._entries[key]
+            if createdTime < time() - self._ttl:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self._entries.pop(key, None)
+            return None
+
+    def put(self, key: str, data: bytes):
+        tempPath = self._path(key) + ".tmp"
+        with open(tempPath, "wb") as f:
+            f.write(data)
+        os.replace(tempPath, self._path(key))
+        with self._lock:
+            self._entries[key] = (len(data), time())
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def cached(
+        self, url: str, producer: Callable[[], bytes], **transform: Any
+    ) -> bytes:
+        """Return the processed image of `url`, or produce and cache it
+
+        Parameters
+        ----------
+        url : str
+            Address the image is downloaded from
+        producer : Callable[[], bytes]
+            Function downloading and processing the image,
+            its result must come from `convertImageFormat`
+        **transform
+            Everything else deciding the result of `producer`, such as mosaic
+
+        Returns
+        -------
+        bytes
+            Processed image, concurrent calls with the same key produce it once
+        """
+        key = self.key(url, **transform)
+        with self._lock:
+            producing = self._producing.setdefault(key, Lock())
+        try:
+            with producing:
+                data = self.get(key)
+                hit = data is not None
+                with self._lock:
+                    self._counters["hit" if hit else "miss"] += 1
+                if not hit:
+                    data = producer()
+                    self.put(key, data)
+        finally:
+            with self._lock:
+                if self._producing.get(key) is producing:
+                    del self._producing[key]
+        if hit:
+            logger.debug(f"Image {url} is served from cache.")
+            return renewImageNoise(data)
+        return data
+
+    @property
+    def statistics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size": sum(size for size, _ in self._entries.values()),
+                **self._counters,
+            }
+
+
+ImageCache = _ImageCache()
@@ -1,40 +1,339 @@
+import atexit
 import json
-from functools import wraps
+import os
+import sqlite3
+import threading
 from os.path import isfile as isFileExist
-from typing import Any, List, Optional, Dict
-from copy import deepcopy
+from time import time
+from types import MappingProxyType
+from typing import Any, List, Optional, Dict, Set, Tuple, Union
 
 from nonebot import logger
 
 from .botConfig import settings
+from .exception import ExceptionProcess
 
 Settings_T = Dict[str, Any]
 
 SETTING_DIR = "./data/pluginSettings.json"
+SETTING_DATABASE_DIR = "./data/pluginSettings.sqlite"
+SAVE_DELAY = 2
+SAVE_MAX_DELAY = 15
 
-_CACHE: Settings_T = {}
-_MODIFED = True
+_LOCK = threading.RLock()
 
 
-class _SettingsIO:
-    @staticmethod
-    def read() -> Settings_T:
-        if not isFileExist(SETTING_DIR):
+def freeze(value: Any) -> Any:
+    """Convert a value into a read-only snapshot
+
+    Dicts become `MappingProxyType` and lists become tuples, recursively.
+    """
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(i) for i in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Convert a snapshot made by `freeze` back into a mutable copy"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(i) for i in value]
+    return value
+
+
+def _jsonDefault(value: Any) -> Any:
+    if isinstance(value, MappingProxyType):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _freezeCache(data: Settings_T) -> Settings_T:
+    for plugin in data.values():
+        for field in ("settings", "status"):
+            plugin[field]["default"] = freeze(plugin[field]["default"])
+            for type in ("group", "user"):
+                plugin[field][type] = {
+                    k: freeze(v) for k, v in plugin[field][type].items()
+                }
+    return data
+
+
+SettingKey_T = Tuple[str, str, str]
+
+_FIELDS = ("settings", "status")
+_MISSING = object()
+
+
+class _JsonBackend:
+    lazy = False
+
+    def __init__(self, path: str = SETTING_DIR):
+        """Store all plugin settings in a single JSON file
+
+        Parameters
+        ----------
+        path : str, optional
+            Path of the JSON file, by default "./data/pluginSettings.json"
+        """
+        self.path = path
+
+    def load(self) -> Settings_T:
+        if not isFileExist(self.path):
             return {}
-        with open(SETTING_DIR, "rt", encoding="utf-8") as f:
+        with open(self.path, "rt", encoding="utf-8") as f:
             fileRead = f.read()
-        return json.loads(fileRead)
+        return _freezeCache(json.loads(fileRead))
+
+    def fetch(self, cache: Settings_T, key: SettingKey_T):
+        pass
 
     @staticmethod
-    def write(data: Settings_T) -> int:
-        dumpedData = (
-            json.dumps(data, ensure_ascii=False, sort_keys=True, indent=4)
+    def dump(data: Settings_T) -> str:
+        return (
+            json.dumps(
+                data,
+                ensure_ascii=False,
+                sort_keys=True,
+                indent=4,
+                default=_jsonDefault,
+            )
             if settings.DEBUG
-            else json.dumps(data)
+            else json.dumps(data, default=_jsonDefault)
         )
-        with open(SETTING_DIR, "wt", encoding="utf-8") as f:
-            writeBytes = f.write(dumpedData)
-        return writeBytes
+
+    def save(self, cache: Settings_T, keys: Set[SettingKey_T]) -> int:
+        with _LOCK:
+            dumpedData = self.dump(cache)
+        tempPath = self.path + ".tmp"
+        with open(tempPath, "wt", encoding="utf-8") as f:
+            f.write(dumpedData)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tempPath, self.path)
+        return len(keys)
+
+
+class _SQLiteBackend:
+    lazy = True
+
+    def __init__(self, path: str = SETTING_DATABASE_DIR, jsonPath: str = SETTING_DIR):
+        """Store plugin settings as rows keyed by (plugin, type, id) in SQLite
+
+        Only the defaults of plugins are loaded at startup,
+        settings of a chat are loaded the first time they are read.
+        An existing JSON settings file is migrated on first use.
+
+        Parameters
+        ----------
+        path : str, optional
+            Path of the database, by default "./data/pluginSettings.sqlite"
+        jsonPath : str, optional
+            Path of the JSON file to migrate from,
+            by default "./data/pluginSettings.json"
+        """
+        self._lock = threading.Lock()
+        self._fetched: Set[SettingKey_T] = set()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS plugin_settings (
+                    plugin TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    id TEXT NOT NULL,
+                    settings TEXT,
+                    status TEXT,
+                    PRIMARY KEY (plugin, type, id)
+                )
+                """)
+            (rows,) = self._connection.execute(
+                "SELECT COUNT(*) FROM plugin_settings"
+            ).fetchone()
+        if not rows and isFileExist(jsonPath):
+            self._migrate(jsonPath)
+
+    def _migrate(self, jsonPath: str):
+        data = _JsonBackend(jsonPath).load()
+        keys: Set[SettingKey_T] = set()
+        for pluginName, plugin in data.items():
+            keys.add((pluginName, "default", "default"))
+            for field in _FIELDS:
+                for type in ("group", "user"):
+                    keys.update((pluginName, type, id) for id in plugin[field][type])
+        writeRows = self.save(data, keys)
+        os.replace(jsonPath, jsonPath + ".migrated")
+        logger.info(
+            f"{writeRows} plugin settings have been migrated from {jsonPath}, "
+            + f'the original file was renamed to "{jsonPath}.migrated".'
+        )
+
+    @staticmethod
+    def _encode(value: Any) -> Optional[str]:
+        return None if value is _MISSING else json.dumps(value, default=_jsonDefault)
+
+    def load(self) -> Settings_T:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT plugin, settings, status FROM plugin_settings "
+                + "WHERE type = 'default'"
+            ).fetchall()
+        return {
+            pluginName: {
+                field: {"group": {}, "user": {}, "default": freeze(json.loads(value))}
+                for field, value in zip(_FIELDS, values)
+            }
+            for pluginName, *values in rows
+        }
+
+    def fetch(self, cache: Settings_T, key: SettingKey_T):
+        """Load settings of a chat into `cache` if they were never loaded"""
+        if key in self._fetched:
+            return
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT settings, status FROM plugin_settings "
+                + "WHERE plugin = ? AND type = ? AND id = ?",
+                key,
+            ).fetchone()
+        pluginName, type, id = key
+        with _LOCK:
+            if key in self._fetched:
+                return
+            self._fetched.add(key)
+            for field, value in zip(_FIELDS, row or ()):
+                if value is not None:
+                    cache[pluginName][field][type].setdefault(
+                        id, freeze(json.loads(value))
+                    )
+
+    def save(self, cache: Settings_T, keys: Set[SettingKey_T]) -> int:
+        resets: List[Tuple[str]] = []
+        deletes: List[SettingKey_T] = []
+        upserts: List[Tuple[str, str, str, Optional[str], Optional[str]]] = []
+        with _LOCK:
+            for key in keys:
+                pluginName, type, id = key
+                if pluginName not in cache:
+                    continue
+                if type == "default":
+                    # Defaults only change when a plugin is registered again,
+                    # which also drops all of its chat settings
+                    resets.append((pluginName,))
+                    values = [cache[pluginName][i]["default"] for i in _FIELDS]
+                else:
+                    values = [
+                        cache[pluginName][i][type].get(id, _MISSING) for i in _FIELDS
+                    ]
+                if all(i is _MISSING for i in values):
+                    deletes.append(key)
+                else:
+                    upserts.append((*key, *map(self._encode, values)))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "DELETE FROM plugin_settings WHERE plugin = ?", resets
+            )
+            self._connection.executemany(
+                "DELETE FROM plugin_settings WHERE plugin = ? AND type = ? AND id = ?",
+                deletes,
+            )
+            self._connection.executemany(
+                """
+                INSERT INTO plugin_settings (plugin, type, id, settings, status)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (plugin, type, id) DO UPDATE
+                SET settings = excluded.settings, status = excluded.status
+                """,
+                upserts,
+            )
+        return len(deletes) + len(upserts)
+
+
+class _SettingsSaver:
+    def __init__(
+        self,
+        backend: Union[_JsonBackend, _SQLiteBackend],
+        delay: float = SAVE_DELAY,
+        maxDelay: float = SAVE_MAX_DELAY,
+    ):
+        """Debounced background writer of plugin settings
+
+        Parameters
+        ----------
+        backend : Union[_JsonBackend, _SQLiteBackend]
+            Backend to save modified settings to
+        delay : float, optional
+            Seconds without further changes before saving, by default 2
+        maxDelay : float, optional
+            Maximum seconds a change waits to be saved, by default 15
+        """
+        self._backend = backend
+        self._delay, self._maxDelay = delay, maxDelay
+        self._condition = threading.Condition()
+        self._writeLock = threading.Lock()
+        self._keys: Set[SettingKey_T] = set()
+        self._firstChange: Optional[float] = None
+        self._lastChange = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def schedule(self, *keys: SettingKey_T):
+        """Mark settings as modified, they will be saved later in background"""
+        with self._condition:
+            self._keys.update(keys)
+            self._lastChange = time()
+            if self._firstChange is None:
+                self._firstChange = self._lastChange
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._worker, name="SettingsSaver", daemon=True
+                )
+                self._thread.start()
+            self._condition.notify_all()
+
+    def flush(self) -> int:
+        """Save pending modifications immediately
+
+        Returns
+        -------
+        int
+            Number of settings saved, 0 if nothing was modified
+        """
+        with self._writeLock:
+            with self._condition:
+                if self._firstChange is None:
+                    return 0
+                keys, self._keys = self._keys, set()
+                self._firstChange = None
+            try:
+                writeRows = self._backend.save(_CACHE, keys)
+            except (OSError, sqlite3.Error) as e:
+                traceID = ExceptionProcess.catch()
+                logger.warning(
+                    f"Failed to save plugin settings due to {e} "
+                    + f"(Traceback ID:{traceID}), will retry later."
+                )
+                self.schedule(*keys)
+                return 0
+        logger.debug(f"{writeRows} plugin settings have been saved.")
+        return writeRows
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._firstChange is not None)
+                while True:
+                    remain = (
+                        min(
+                            self._lastChange + self._delay,
+                            self._firstChange + self._maxDelay,
+                        )
+                        - time()
+                    )
+                    if remain <= 0:
+                        break
+                    self._condition.wait(remain)
+            self.flush()
 
 
 def nameJoin(pluginName: str, *methodsName: str) -> str:
@@ -63,19 +362,54 @@ def nameJoin(pluginName: str, *methodsName: str) -> str:
     return ".".join(methodsName)
 
 
-def _checker(function):
-    @wraps(function)
-    def wrapper(*args, **kwargs):
-        global _MODIFED, _CACHE
-        if _MODIFED:
-            if _CACHE:
-                _SettingsIO.write(_CACHE)
-            _CACHE = _SettingsIO.read()
-            logger.debug(f"Plugin configuration has been updated:{_CACHE}")
-            _MODIFED = False
-        return function(*args, **kwargs)
+assert settings.SETTINGS_BACKEND in ("json", "sqlite")
+_BACKEND = _SQLiteBackend() if settings.SETTINGS_BACKEND == "sqlite" else _JsonBackend()
+_CACHE: Settings_T = _BACKEND.load()
+_SAVER = _SettingsSaver(_BACKEND)
+atexit.register(_SAVER.flush)
+
+
+class _StatusIndex:
+    def __init__(self):
+        """Index from a chat to the bitset of plugins enabled in it
 
-    return wrapper
+        Each registered plugin owns one bit. The bitset of a chat is
+        resolved on first lookup and kept in sync by the status setter.
+        """
+        self._bits: Dict[str, int] = {}
+        self._masks: Dict[Tuple[str, int], int] = {}
+
+    def register(self, pluginName: str):
+        with _LOCK:
+            if pluginName not in self._bits:
+                self._bits[pluginName] = 1 << len(self._bits)
+            self._masks.clear()
+
+    def _resolve(self, type: str, id: int) -> int:
+        with _LOCK:
+            mask = 0
+            for pluginName, bit in self._bits.items():
+                if SingleSetting(pluginName, type, id).status:
+                    mask |= bit
+            self._masks[type, id] = mask
+        return mask
+
+    def enabled(self, pluginName: str, type: str, id: int) -> bool:
+        mask = self._masks.get((type, id))
+        if mask is None:
+            mask = self._resolve(type, id)
+        return bool(mask & self._bits[pluginName])
+
+    def update(self, pluginName: str, type: str, id: int, status: bool):
+        with _LOCK:
+            mask = self._masks.get((type, id))
+            if mask is None:
+                return
+            bit = self._bits[pluginName]
+            self._masks[type, id] = mask | bit if status else mask & ~bit
+
+
+_INDEX = _StatusIndex()
 
 
 class SingleSetting(object):
@@ -96,43 +430,44 @@ class SingleSetting(object):
         self.name, self.type = pluginName, type
         self.id = str(id) if isinstance(id, int) else "default"
 
+    def _read(self, field: str) -> Any:
+        stored = _CACHE[self.name][field]
+        if _BACKEND.lazy and self.id not in stored[self.type]:
+            _BACKEND.fetch(_CACHE, (self.name, self.type, self.id))
+        return stored[self.type].get(self.id, stored["default"])
+
+    def _write(self, field: str, value: Any):
+        value = freeze(value)
+        with _LOCK:
+            if value == self._read(field):
+                return
+            _CACHE[self.name][field][self.type][self.id] = value
+            if field == "status" and self.id != "default":
+                _INDEX.update(self.name, self.type, int(self.id), value)
+        _SAVER.schedule((self.name, self.type, self.id))
+
     @property
-    @_checker
     def settings(self) -> Any:
-        return deepcopy(
-            _CACHE[self.name]["settings"][self.type].get(
-                self.id, _CACHE[self.name]["settings"]["default"]
-            )
-        )
+        """Read-only snapshot of the settings
+
+        Use `thaw` to get a mutable copy, then assign it back to modify.
+        """
+        return self._read("settings")
 
     @property
-    @_checker
     def status(self) -> bool:
-        return deepcopy(
-            _CACHE[self.name]["status"][self.type].get(
-                self.id, _CACHE[self.name]["status"]["default"]
-            )
-        )
+        return self._read("status")
 
     @settings.setter
     def settings(self, value):
-        if value == self.settings:
-            return
-        global _MODIFED, _CACHE
-        _MODIFED = True
-        _CACHE[self.name]["settings"][self.type][self.id] = value
+        self._write("settings", value)
 
     @status.setter
     def status(self, value):
-        if value == self.status:
-            return
-        global _MODIFED, _CACHE
-        _MODIFED = True
-        _CACHE[self.name]["status"][self.type][self.id] = value
+        self._write("status", value)
 
 
 class _PluginManager:
-    @_checker
     def __call__(
         self,
         pluginName: str,
@@ -150,21 +485,30 @@ class _PluginManager:
         defaultSettings : Optional[Any], optional
             Empty by default, by default {}
         """
-        global _MODIFED, _CACHE
-        if _CACHE.get(pluginName):
-            inCacheDefault = _CACHE[pluginName]["settings"]["default"]
-            inCacheSetting = _CACHE[pluginName]["status"]["default"]
-            if inCacheDefault == defaultSettings and inCacheSetting == defaultStatus:
-                return
-        _MODIFED = True
-        _CACHE.update(
-            {
-                pluginName: {
-                    "settings": {"group": {}, "user": {}, "default": defaultSettings},
-                    "status": {"group": {}, "user": {}, "default": defaultStatus},
+        defaultSettings = freeze(defaultSettings)
+        with _LOCK:
+            _INDEX.register(pluginName)
+            if _CACHE.get(pluginName):
+                inCacheDefault = _CACHE[pluginName]["settings"]["default"]
+                inCacheSetting = _CACHE[pluginName]["status"]["default"]
+                if (
+                    inCacheDefault == defaultSettings
+                    and inCacheSetting == defaultStatus
+                ):
+                    return
+            _CACHE.update(
+                {
+                    pluginName: {
+                        "settings": {
+                            "group": {},
+                            "user": {},
+                            "default": defaultSettings,
+                        },
+                        "status": {"group": {}, "user": {}, "default": defaultStatus},
+                    }
                 }
-            }
-        )
+            )
+        _SAVER.schedule((pluginName, "default", "default"))
         logger.debug(
             f"Register a new plugin:{pluginName},"
             + f"settings={defaultSettings},status={defaultStatus}"
@@ -217,5 +561,27 @@ class _PluginManager:
         )
         return self._getSettings(**settingsArgs)
 
+    def enabled(self, pluginName: str, ctx: dict) -> bool:
+        """Check whether a plugin is enabled in the chat of `ctx`
+
+        Unlike `settings(...).status`, this is a single bit test
+        against a precomputed index, cheap enough for every message.
+
+        Parameters
+        ----------
+        pluginName : str
+            Plugin name
+        ctx : dict
+            ctx content
+
+        Returns
+        -------
+        bool
+            Whether the plugin is enabled
+        """
+        if ctx["message_type"] == "group":
+            return _INDEX.enabled(pluginName, "group", ctx["group_id"])
+        return _INDEX.enabled(pluginName, "user", ctx["user_id"])
+
 
 PluginManager = _PluginManager()
@@ -0,0 +1,109 @@
+import os
+import re
+from base64 import b64encode
+from secrets import token_hex
+from time import time
+
+from nonebot import get_bot, logger, scheduler
+from quart import abort, send_file
+
+from . import UtilsConfig
+from .decorators import SyncToAsync
+from .objects import imageExtension
+
+MEDIA_DIR = "./data/media"
+MEDIA_ROUTE = "/media"
+CLEANUP_INTERVAL = 10 * 60
+MEDIA_NAME_REGEX = re.compile(r"^[0-9a-f]{32}\.(png|jpg|webp|gif)$")
+
+
+class _MediaStore:
+    def __init__(self, mediaDir: str = MEDIA_DIR):
+        self.configObject = UtilsConfig.media
+        os.makedirs(mediaDir, exist_ok=True)
+        self._dir = os.path.abspath(mediaDir)
+
+    @property
+    def mode(self) -> str:
+        return str(self.configObject["mode"]).lower()
+
+    def image(self, image: bytes) -> str:
+        """Build the address of an image which is accepted by `MessageSegment.image`
+
+        Depending on configuration file, the image is inlined as base64,
+        or written once to the media directory and referenced
+        by a `file:///` address or an address of the HTTP route of the bot.
+
+        Parameters
+        ----------
+        image : bytes
+            Processed image
+
+        Returns
+        -------
+        str
+            Image address
+        """
+        mode = self.mode
+        if mode not in ("file", "http"):
+            return f"base64://{b64encode(image).decode()}"
+        fileName = f"{token_hex(16)}.{imageExtension(image)}"
+        filePath = os.path.join(self._dir, fileName)
+        with open(filePath + ".tmp", "wb") as f:
+            f.write(image)
+        os.replace(filePath + ".tmp", filePath)
+        if mode == "file":
+            return "file:///" + filePath.replace(os.sep, "/").lstrip("/")
+        address = str(self.configObject["address"]).rstrip("/")
+        return f"{address}{MEDIA_ROUTE}/{fileName}"
+
+    def path(self, fileName: str) -> str:
+        """Path of a stored image, raise `FileNotFoundError` for unknown names"""
+        filePath = os.path.join(self._dir, fileName)
+        if not MEDIA_NAME_REGEX.match(fileName) or not os.path.isfile(filePath):
+            raise FileNotFoundError(fileName)
+        return filePath
+
+    def cleanup(self) -> int:
+        """Delete images stored for longer than the lifetime in configuration file
+
+        Returns
+        -------
+        int
+            Number of deleted images
+        """
+        deadline = time() - self.configObject["ttl"]
+        deleted = 0
+        for entry in os.scandir(self._dir):
+            if not entry.is_file() or entry.stat().st_mtime >= deadline:
+                continue
+            try:
+                os.remove(entry.path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+        logger.debug(f"{deleted} expired images have been deleted from media store.")
+        return deleted
+
+
+MediaStore = _MediaStore()
+
+
+async def _serveMedia(fileName: str):
+    try:
+        filePath = MediaStore.path(fileName)
+    except FileNotFoundError:
+        abort(404)
+    return await send_file(filePath)
+
+
+@scheduler.scheduled_job("interval", seconds=CLEANUP_INTERVAL)
+@SyncToAsync
+def _cleanupMedia():
+    MediaStore.cleanup()
+
+
+if MediaStore.mode == "http":
+    get_bot().server_app.add_url_rule(
+        f"{MEDIA_ROUTE}/<fileName>", "media", _serveMedia, methods=["GET"]
+    )
@@ -1,9 +1,19 @@
+import asyncio
 from functools import partial, wraps
+from inspect import unwrap
 from re import compile as compileRegexp
+from time import time
 from typing import Callable, Optional, Tuple, Union
 
 from aiocqhttp import Event
-from nonebot import CommandSession, NLPSession, NoneBot, NoticeSession, RequestSession
+from nonebot import (
+    CommandSession,
+    NLPSession,
+    NoneBot,
+    NoticeSession,
+    RequestSession,
+    get_bot,
+)
 from nonebot.command import (
     SwitchException,
     ValidateError,
@@ -20,6 +30,7 @@ from .botConfig import settings
 from .decorators import Timeit
 from .exception import (
     BaseBotError,
+    BotBusyError,
     BotDisabledError,
     BotExistError,
     BotMessageError,
@@ -35,18 +46,77 @@ from .objects import SyncWrapper
 
 UnionSession = Union[CommandSession, NLPSession, NoticeSession, RequestSession]
 CQ_CODE = compileRegexp(r"\[(CQ:\w+)(?:,\w+=[^,]+)*\]")
+LOGIN_INFO_TTL = 10 * 60
+
+
+class _LoginInfoCache:
+    def __init__(self, ttl: float = LOGIN_INFO_TTL):
+        """Cached login info of the bot account
+
+        Parameters
+        ----------
+        ttl : float, optional
+            Seconds before the cached info is refreshed, by default 10 minutes
+        """
+        self.ttl = ttl
+        self.userID: Optional[int] = None
+        self.filtered = 0
+        self._expireTime = 0.0
+        self._refreshing: Optional[asyncio.Future] = None
+
+    async def _refresh(self, bot: NoneBot):
+        loginInfo = await bot.get_login_info()
+        self.userID, self._expireTime = loginInfo["user_id"], time() + self.ttl
+        logger.debug(f"Login info of bot has been refreshed: {loginInfo}")
+
+    @staticmethod
+    def _refreshDone(future: asyncio.Future):
+        if not future.cancelled() and future.exception():
+            logger.warning(f"Failed to refresh login info: {future.exception()}")
+
+    def refresh(self, bot: NoneBot) -> asyncio.Future:
+        """Refresh login info in background, concurrent calls share one request"""
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._refresh(bot))
+            self._refreshing.add_done_callback(self._refreshDone)
+        return self._refreshing
+
+    def invalidate(self, bot: NoneBot):
+        self._expireTime = 0.0
+        self.refresh(bot)
+
+    async def check(self, bot: NoneBot, selfID: int) -> bool:
+        """Check whether an event was received by the logged in account
+
+        Only the first call waits for the API,
+        afterwards stale info is refreshed without blocking.
+        """
+        if self.userID is None:
+            await asyncio.shield(self.refresh(bot))
+        elif time() > self._expireTime:
+            self.refresh(bot)
+        if self.userID == selfID:
+            return True
+        self.filtered += 1
+        return False
+
+
+LoginInfo = _LoginInfoCache()
 
 
 @message_preprocessor
 async def _(bot: NoneBot, event: Event, plugin_manager):
-    loginInfo = await bot.get_login_info()
-
-    if loginInfo["user_id"] != event.self_id:
+    if not await LoginInfo.check(bot, event.self_id):
         raise CanceledException(None)
 
     return
 
 
+@get_bot().on_meta_event("lifecycle")
+async def _(event: Event):
+    LoginInfo.invalidate(get_bot())
+
+
 def _shortCQCode(message: str) -> str:
     return CQ_CODE.sub(r"[\1...]", message).__repr__()
 
@@ -88,16 +158,36 @@ def processSession(
     function: Callable = None,
     *,
     pluginName: Optional[str] = None,
-    convertToSync: Optional[bool] = True,
+    convertToSync: Optional[bool] = None,
 ) -> Callable:
+    """Decorator, wrap a session handler with status check, reply and error report
+
+    Parameters
+    ----------
+    pluginName : Optional[str], optional
+        Skip the handler when this plugin is disabled in the chat, by default None
+    convertToSync : Optional[bool], optional
+        Pass a `SyncWrapper` of the session to the handler,
+        by default only if the handler is not a coroutine function.
+        Handlers defined with `async def` run on the event loop
+        and get the original session.
+    """
 
     if function is None:
         return partial(
             processSession, pluginName=pluginName, convertToSync=convertToSync
         )
 
+    if convertToSync is None:
+        convertToSync = not asyncio.iscoroutinefunction(function)
+
+    # Handlers are often all named `_`, so the line tells them apart
+    handler = unwrap(function)
+    lineNumber = handler.__code__.co_firstlineno if hasattr(handler, "__code__") else 0
+    timerName = f"session:{handler.__module__}.{handler.__qualname__}:{lineNumber}"
+
     @wraps(function)
-    @Timeit
+    @Timeit(name=timerName)
     @_messageSender
     async def wrapper(session: UnionSession, *args, **kwargs):
         assert isinstance(session, BaseSession)
@@ -106,7 +196,7 @@ def processSession(
         sessionMessage: str = extract_text(session.ctx["message"])
 
         enabled = (
-            PluginManager.settings(pluginName=pluginName, ctx=session.ctx).status
+            PluginManager.enabled(pluginName=pluginName, ctx=session.ctx)
             if pluginName
             else True
         )
@@ -163,6 +253,8 @@ def processSession(
             if not e.trace:
                 e.trace = ExceptionProcess.catch()
             return f"您不具有权限,原因:{e.reason},追踪ID:{e.trace}"
+        except BotBusyError as e:
+            return f"机器人繁忙,原因:{e.reason}"
         except BotNetworkError as e:
             if not e.trace:
                 e.trace = ExceptionProcess.catch()
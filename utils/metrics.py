@@ -0,0 +1,154 @@
+from bisect import bisect_left
+from threading import Lock
+from typing import Any, Callable, Dict, List, Tuple
+
+from .botConfig import settings
+
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count", "errors", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """Latency histogram of a single function
+
+        Parameters
+        ----------
+        buckets : Tuple[float, ...], optional
+            Sorted upper bounds of buckets in seconds,
+            an extra bucket catches everything above the last one
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum, self.count, self.errors = 0.0, 0, 0
+        self._lock = Lock()
+
+    def observe(self, seconds: float, error: bool = False):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += seconds
+            self.count += 1
+            if error:
+                self.errors += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q` quantile,
+        infinity if it is above the last bucket"""
+        with self._lock:
+            counts, count = self.counts.copy(), self.count
+        rank, accumulated = q * count, 0
+        for bound, bucketCount in zip(self.buckets, counts):
+            accumulated += bucketCount
+            if count and accumulated >= rank:
+                return bound
+        return float("inf")
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counts": self.counts.copy(),
+                "sum": self.sum,
+                "count": self.count,
+                "errors": self.errors,
+            }
+
+
+def _escapeLabel(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def renderHistograms(
+    metricName: str, help: str, labelName: str, statuses: Dict[str, Dict[str, Any]]
+) -> List[str]:
+    """Render `Histogram.status` of each label value in Prometheus text format"""
+    lines = [f"# HELP {metricName} {help}", f"# TYPE {metricName} histogram"]
+    for name, status in statuses.items():
+        label = f'{labelName}="{_escapeLabel(name)}"'
+        accumulated = 0
+        for bound, count in zip(LATENCY_BUCKETS, status["counts"]):
+            accumulated += count
+            lines.append(f'{metricName}_bucket{{{label},le="{bound}"}} {accumulated}')
+        lines += [
+            f'{metricName}_bucket{{{label},le="+Inf"}} {status["count"]}',
+            f'{metricName}_sum{{{label}}} {status["sum"]}',
+            f'{metricName}_count{{{label}}} {status["count"]}',
+        ]
+    return lines
+
+
+def renderValues(
+    metricName: str, type: str, help: str, labelName: str, values: Dict[str, float]
+) -> List[str]:
+    """Render a counter or gauge of each label value in Prometheus text format"""
+    lines = [f"# HELP {metricName} {help}", f"# TYPE {metricName} {type}"]
+    for name, value in values.items():
+        lines.append(f'{metricName}{{{labelName}="{_escapeLabel(name)}"}} {value}')
+    return lines
+
+
+class _MetricsRegistry:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: List[Callable[[], List[str]]] = []
+        self._lock = Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        """Get the histogram of `name`, created if it does not exist"""
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram()
+            return self._histograms[name]
+
+    def registerCollector(self, collector: Callable[[], List[str]]):
+        """Register a function returning extra lines for `render`"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    @property
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            histograms = self._histograms.copy()
+        return {name: i.status for name, i in sorted(histograms.items())}
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format"""
+        status = self.status
+        lines = renderHistograms(
+            "bot_function_duration_seconds",
+            "Latency of functions decorated by Timeit.",
+            "function",
+            status,
+        ) + renderValues(
+            "bot_function_errors_total",
+            "counter",
+            "Calls of functions decorated by Timeit that raised.",
+            "function",
+            {name: i["errors"] for name, i in status.items()},
+        )
+        with self._lock:
+            collectors = self._collectors.copy()
+        for collector in collectors:
+            lines += collector()
+        return "\n".join(lines) + "\n"
+
+
+Metrics = _MetricsRegistry(settings.METRICS_ENABLE)
@@ -1,16 +1,33 @@
+import asyncio
 from copy import deepcopy
-from typing import Dict, List
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, Dict, List, Optional, Tuple, Union
 
-import requests
+import httpx
+from nonebot import get_bot
 
 from . import UtilsConfig
-from .decorators import CatchRequestsException
-from .exception import BotNotFoundError
+from .decorators import (
+    AsyncToSync,
+    CatchRequestsException,
+    CircuitBreakers,
+    CircuitOpenError,
+)
+from .exception import BotNotFoundError, BotRequestError
+from .tmpFile import TEMP_DIR
+
+Timeout_T = Union[None, float, Tuple[float, Optional[float]], httpx.Timeout]
+MAX_DOWNLOAD_SIZE = 32 * 1024 ** 2
+SPOOL_SIZE = 1024 ** 2
 
 
 class _NetworkUtils:
     def __init__(self):
         self.configObject = UtilsConfig.network
+        self.clientConfig = UtilsConfig.client
+        self._client: Optional[httpx.AsyncClient] = None
+        self._proxyClient: Optional[httpx.AsyncClient] = None
+        self._hostLimits: Dict[str, asyncio.Semaphore] = {}
 
     @property
     def proxy(self) -> Dict[str, str]:
@@ -33,31 +50,235 @@ class _NetworkUtils:
         )
         return deepcopy(retValue)
 
-    def shortLink(self, links: List[str]) -> Dict[str, str]:
-        """Short link function to generate short links
+    @property
+    def proxyAddress(self) -> Optional[str]:
+        """Global network proxy address in the format accepted by `httpx`"""
+        proxySettings: dict = self.configObject.proxy
+        return proxySettings["address"] if proxySettings["enable"] else None
+
+    def _createClient(self, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            proxy=proxy,
+            timeout=httpx.Timeout(
+                self.clientConfig["timeout"],
+                connect=self.clientConfig["connect_timeout"],
+            ),
+            limits=httpx.Limits(
+                max_connections=self.clientConfig["max_connections"],
+                max_keepalive_connections=self.clientConfig["keepalive"],
+            ),
+            follow_redirects=True,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared pooled asynchronous HTTP client, must be used on the event loop
+
+        Prefer `request`, which also applies the per-host connection limit.
+        """
+        if self._client is None:
+            self._client = self._createClient()
+        return self._client
+
+    @property
+    def proxyClient(self) -> httpx.AsyncClient:
+        """Same as `client`, but requests go through the global network proxy"""
+        if self._proxyClient is None:
+            self._proxyClient = self._createClient(self.proxyAddress)
+        return self._proxyClient
+
+    def hostLimit(self, url: str) -> asyncio.Semaphore:
+        """Semaphore limiting concurrent requests to the host of `url`"""
+        host = httpx.URL(url).host
+        semaphore = self._hostLimits.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.clientConfig["max_per_host"])
+            self._hostLimits[host] = semaphore
+        return semaphore
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        proxy: bool = True,
+        timeout: Timeout_T = None,
+        **kwargs,
+    ) -> httpx.Response:
+        """Send a request with the shared client
 
         Parameters
         ----------
-        links : List[str]
-            A list of URLs to be shortened
+        method : str
+            HTTP method
+        url : str
+            Request address
+        proxy : bool, optional
+            Use the global network proxy if it is enabled, by default True
+        timeout : Timeout_T, optional
+            Seconds, or a tuple of (connect, read) seconds like `requests`,
+            by default the timeout in configuration file
+        **kwargs
+            Other arguments accepted by `httpx.AsyncClient.request`
 
         Returns
         -------
-        Dict[str, str]
-            Back to dictionary type, original link: short link
+        httpx.Response
+            Response with its content already read
 
         Raises
         ------
-        BotNotFoundError
-            Throws when short link API settings are not written in the configuration file
+        CircuitOpenError
+            Circuit breaker of the host is open, the request is not sent
         """
+        client = self._prepare(url, proxy, timeout, kwargs)
+        breaker = CircuitBreakers[httpx.URL(url).host]
+        try:
+            async with self.hostLimit(url):
+                response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            breaker.failure()
+            raise
+        except BaseException:
+            breaker.release()
+            raise
+        if response.is_server_error:
+            breaker.failure()
+        else:
+            breaker.success()
+        return response
 
-        @CatchRequestsException(prompt="短链接因为网络连接原因生成失败", retries=3)
-        def requestShortLink(link: str, params: dict) -> Dict[str, dict]:
-            r = requests.get(url=link, params=params)
-            r.raise_for_status()
-            return r.json()
+    def _prepare(
+        self, url: str, proxy: bool, timeout: Timeout_T, kwargs: Dict[str, Any]
+    ) -> httpx.AsyncClient:
+        if isinstance(timeout, tuple):
+            connectTimeout, readTimeout = timeout
+            timeout = httpx.Timeout(
+                self.clientConfig["timeout"], connect=connectTimeout, read=readTimeout
+            )
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        host = httpx.URL(url).host
+        if not CircuitBreakers[host].allow():
+            raise CircuitOpenError(host)
+        return self.proxyClient if proxy else self.client
+
+    async def downloadFile(
+        self,
+        url: str,
+        *,
+        maxSize: int = MAX_DOWNLOAD_SIZE,
+        contentTypes: Optional[Tuple[str, ...]] = None,
+        proxy: bool = True,
+        timeout: Timeout_T = None,
+        **kwargs,
+    ) -> IO[bytes]:
+        """Download a file by streaming, with limits checked while reading
+
+        Parameters
+        ----------
+        url : str
+            Download address
+        maxSize : int, optional
+            Maximum bytes of the file, by default 32MiB
+        contentTypes : Optional[Tuple[str, ...]], optional
+            Accepted prefixes of the content type, such as `("image/",)`,
+            by default any content type
+        proxy : bool, optional
+            Use the global network proxy if it is enabled, by default True
+        timeout : Timeout_T, optional
+            Same as `request`
+        **kwargs
+            Other arguments accepted by `httpx.AsyncClient.stream`
+
+        Returns
+        -------
+        IO[bytes]
+            Temporary file at its beginning, kept in memory until it grows
+            over 1MiB, must be closed by the caller
+
+        Raises
+        ------
+        BotRequestError
+            The file is too large or its content type is not accepted,
+            raised as soon as it is known, without reading the rest
+        """
+        client = self._prepare(url, proxy, timeout, kwargs)
+        breaker = CircuitBreakers[httpx.URL(url).host]
+        file = SpooledTemporaryFile(SPOOL_SIZE, dir=TEMP_DIR)
+        try:
+            async with self.hostLimit(url), client.stream(
+                "GET", url, **kwargs
+            ) as response:
+                if response.is_server_error:
+                    breaker.failure()
+                else:
+                    breaker.success()
+                response.raise_for_status()
+                contentType = response.headers.get("Content-Type", "")
+                if contentTypes and not contentType.startswith(contentTypes):
+                    raise BotRequestError(f"不支持的文件类型{contentType}")
+                contentLength = response.headers.get("Content-Length", "")
+                if contentLength.isdigit() and int(contentLength) > maxSize:
+                    raise BotRequestError(
+                        f"文件大小{int(contentLength) / 1024 ** 2:.3f}MiB"
+                        + f"超过了{maxSize / 1024 ** 2:.3f}MiB的限制"
+                    )
+                async for chunk in response.aiter_bytes():
+                    if file.tell() + len(chunk) > maxSize:
+                        raise BotRequestError(
+                            f"文件大小超过了{maxSize / 1024 ** 2:.3f}MiB的限制"
+                        )
+                    file.write(chunk)
+        except httpx.TransportError:
+            file.close()
+            breaker.failure()
+            raise
+        except BaseException:
+            file.close()
+            breaker.release()
+            raise
+        file.seek(0)
+        return file
+
+    async def download(self, url: str, **kwargs) -> bytes:
+        """Same as `downloadFile`, but return the content of the file"""
+        with await self.downloadFile(url, **kwargs) as file:
+            return file.read()
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    def requestSync(self, method: str, url: str, **kwargs) -> httpx.Response:
+        """Blocking version of `request` for code running in the thread pool,
+        the request itself still runs on the event loop with the shared client
+        """
+        return AsyncToSync(self.request)(method, url, **kwargs)
+
+    def getSync(self, url: str, **kwargs) -> httpx.Response:
+        return self.requestSync("GET", url, **kwargs)
+
+    def postSync(self, url: str, **kwargs) -> httpx.Response:
+        return self.requestSync("POST", url, **kwargs)
+
+    def downloadFileSync(self, url: str, **kwargs) -> IO[bytes]:
+        """Blocking version of `downloadFile` for code running in the thread pool"""
+        return AsyncToSync(self.downloadFile)(url, **kwargs)
+
+    def downloadSync(self, url: str, **kwargs) -> bytes:
+        """Blocking version of `download` for code running in the thread pool"""
+        return AsyncToSync(self.download)(url, **kwargs)
 
+    async def close(self):
+        for client in (self._client, self._proxyClient):
+            if client is not None:
+                await client.aclose()
+        self._client = self._proxyClient = None
+
+    def _shortLinkParams(self, links: List[str]) -> Dict[str, Any]:
         shortenSettings: dict = self.configObject.shorten
         authSettings: dict = shortenSettings["auth"]
         if authSettings.get("apikey"):
@@ -74,7 +295,10 @@ class _NetworkUtils:
             "urls[]": links,
         }
         fullParam.update(authParam)
-        responseData = requestShortLink(shortenSettings["address"], fullParam)
+        return fullParam
+
+    @staticmethod
+    def _shortLinkParse(responseData: Dict[str, dict]) -> Dict[str, str]:
         retDict = {}
         for perURL in responseData:
             shortData = responseData[perURL]
@@ -84,5 +308,61 @@ class _NetworkUtils:
             retDict[perURL] = responseData[perURL]["shorturl"]
         return retDict
 
+    def shortLink(self, links: List[str]) -> Dict[str, str]:
+        """Short link function to generate short links
+
+        Parameters
+        ----------
+        links : List[str]
+            A list of URLs to be shortened
+
+        Returns
+        -------
+        Dict[str, str]
+            Back to dictionary type, original link: short link
+
+        Raises
+        ------
+        BotNotFoundError
+            Throws when short link API settings are not written in the configuration file
+        """
+
+        @CatchRequestsException(prompt="短链接因为网络连接原因生成失败", retries=3)
+        def requestShortLink(link: str, params: dict) -> Dict[str, dict]:
+            r = self.getSync(link, params=params, proxy=False)
+            r.raise_for_status()
+            return r.json()
+
+        fullParam = self._shortLinkParams(links)
+        responseData = requestShortLink(self.configObject.shorten["address"], fullParam)
+        return self._shortLinkParse(responseData)
+
+    async def shortLinkAsync(self, links: List[str]) -> Dict[str, str]:
+        """Asynchronous version of `shortLink`, runs on the event loop
+
+        Parameters
+        ----------
+        links : List[str]
+            A list of URLs to be shortened
+
+        Returns
+        -------
+        Dict[str, str]
+            Back to dictionary type, original link: short link
+        """
+
+        @CatchRequestsException(prompt="短链接因为网络连接原因生成失败", retries=3)
+        async def requestShortLink(link: str, params: dict) -> Dict[str, dict]:
+            r = await self.get(link, params=params, proxy=False)
+            r.raise_for_status()
+            return r.json()
+
+        fullParam = self._shortLinkParams(links)
+        responseData = await requestShortLink(
+            self.configObject.shorten["address"], fullParam
+        )
+        return self._shortLinkParse(responseData)
+
 
 NetworkUtils = _NetworkUtils()
+get_bot().server_app.after_serving(NetworkUtils.close)
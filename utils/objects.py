@@ -1,14 +1,22 @@
 from asyncio import iscoroutinefunction
-from os.path import getsize as getFileSize
+from contextlib import nullcontext
+from functools import lru_cache
+from io import BytesIO
+from math import sqrt
 from secrets import token_bytes
-from typing import Any, Dict, Optional, Union, List
+from typing import IO, Any, Dict, Optional, Union, List
 
 from aiocqhttp.exceptions import ActionFailed
 from nonebot import NoneBot, get_bot
 from nonebot.log import logger
-from PIL import Image
+from PIL import Image, features
 
 MAX_IMAGE_SIZE = 4 * 1024 ** 2
+IMAGE_FORMATS = ("JPEG", "WEBP", "PNG")
+LOSSY_FORMATS = ("JPEG", "WEBP")
+FALLBACK_FORMAT = "JPEG"
+QUALITY_STEP = 5
+IMAGE_NOISE_SIZE = 16
 
 
 class EnhancedDict(dict):
@@ -80,10 +88,10 @@ class SyncWrapper:
         return self._sync(originAttr) if iscoroutinefunction(originAttr) else originAttr
 
 
-def callModuleAPI(
+async def callModuleAPIAsync(
     method: str, params: Optional[dict] = {}, ignoreError: Optional[bool] = False
 ) -> Optional[Union[Dict[str, Any], List[Dict[str, Any]]]]:
-    """Call CQHTTP's underlying API
+    """Call CQHTTP's underlying API on the event loop
 
     Parameters
     ----------
@@ -91,22 +99,21 @@ def callModuleAPI(
         The name of the method to call
     params : Optional[dict], optional
         Additional parameters for the call, by default {}
+    ignoreError : Optional[bool], optional
+        Return `None` instead of raising if the call failed, by default False
 
     Returns
     -------
-    Callable
-        The function that called the method
+    Optional[Union[Dict[str, Any], List[Dict[str, Any]]]]
+        Data returned by the API
     """
-    from .decorators import AsyncToSync
-
     botObject: NoneBot = get_bot()
-    syncAPIMethod = AsyncToSync(botObject.call_action)
     logger.debug(
         "CQHTTP native API is being actively called, "
         + f"data: action={method}, params={str(params):.100s}"
     )
     try:
-        return syncAPIMethod(method, **params)
+        return await botObject.call_action(method, **params)
     except ActionFailed as e:
         if ignoreError:
             return
@@ -117,33 +124,175 @@ def callModuleAPI(
         )
 
 
-def convertImageFormat(image: bytes, quality: Optional[int] = 80) -> bytes:
+def callModuleAPI(
+    method: str, params: Optional[dict] = {}, ignoreError: Optional[bool] = False
+) -> Optional[Union[Dict[str, Any], List[Dict[str, Any]]]]:
+    """Call CQHTTP's underlying API, blocking until it returns
+
+    Must not be called from the event loop, use `callModuleAPIAsync` instead.
+
+    Parameters
+    ----------
+    method : str
+        The name of the method to call
+    params : Optional[dict], optional
+        Additional parameters for the call, by default {}
+    ignoreError : Optional[bool], optional
+        Return `None` instead of raising if the call failed, by default False
+
+    Returns
+    -------
+    Optional[Union[Dict[str, Any], List[Dict[str, Any]]]]
+        Data returned by the API
+    """
+    from .decorators import AsyncToSync
+
+    return AsyncToSync(callModuleAPIAsync)(method, params, ignoreError)
+
+
+@lru_cache(maxsize=None)
+def checkImageFormat(format: str) -> str:
+    """Return `format` in upper case if this Pillow build can encode it,
+    otherwise warn once and return `FALLBACK_FORMAT`"""
+    format = format.upper()
+    Image.init()
+    if format not in IMAGE_FORMATS or format not in Image.SAVE:
+        supported = False
+    elif format == "WEBP":
+        supported = features.check("webp")
+    else:
+        supported = True
+    if not supported:
+        logger.warning(
+            f"Image format {format} is not supported by installed Pillow, "
+            + f"images will be sent in {FALLBACK_FORMAT} instead."
+        )
+        return FALLBACK_FORMAT
+    return format
+
+
+def _prepareImage(image: Image.Image, format: str) -> Image.Image:
+    if format == "JPEG" or (format == "WEBP" and image.mode not in ("RGB", "RGBA")):
+        hasAlpha = image.mode in ("RGBA", "LA", "PA") or (
+            image.mode == "P" and "transparency" in image.info
+        )
+        if hasAlpha and format == "JPEG":
+            rgbaImage = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(rgbaImage, mask=rgbaImage)
+            return background
+        return image.convert("RGBA" if hasAlpha else "RGB")
+    if image.mode not in ("1", "L", "LA", "P", "RGB", "RGBA"):
+        return image.convert("RGB")
+    return image
+
+
+def _encodeImage(image: Image.Image, format: str, quality: int) -> bytes:
+    with BytesIO() as buffer:
+        if format in LOSSY_FORMATS:
+            image.save(buffer, format, quality=quality)
+        else:
+            image.save(buffer, format)
+        return buffer.getvalue()
+
+
+def _fitImage(
+    image: Image.Image, format: str, quality: int, minQuality: int, size: int
+) -> bytes:
+    """Encode `image` under `MAX_IMAGE_SIZE`, trying to lower the quality first
+    and then the scale, which is estimated from the size of the last encode"""
+    scaled = image
+    while True:
+        if format in LOSSY_FORMATS:
+            # Binary search for the highest quality that fits
+            qualities = list(range(minQuality, quality + 1, QUALITY_STEP))
+            low, high, fitted = 0, len(qualities) - 1, None
+            while low <= high:
+                middle = (low + high) // 2
+                data = _encodeImage(scaled, format, qualities[middle])
+                if len(data) <= MAX_IMAGE_SIZE:
+                    fitted, low = data, middle + 1
+                else:
+                    size, high = len(data), middle - 1
+            if fitted is not None:
+                return fitted
+        elif scaled is not image:
+            data = _encodeImage(scaled, format, quality)
+            if len(data) <= MAX_IMAGE_SIZE:
+                return data
+            size = len(data)
+        # Encoded size is roughly proportional to the number of pixels
+        ratio = min(0.9, max(0.5, sqrt(MAX_IMAGE_SIZE / size) * 0.95))
+        width, height = scaled.size
+        scaled = scaled.resize(
+            (max(1, int(width * ratio)), max(1, int(height * ratio))), Image.BICUBIC
+        )
+
+
+def convertImageFormat(
+    image: Union[bytes, IO[bytes], Image.Image],
+    quality: Optional[int] = None,
+    format: Optional[str] = None,
+) -> bytes:
     """Convert picture format to solve the problem of unrecognizable pictures
 
+    The image is decoded once in memory and encoded under `MAX_IMAGE_SIZE`.
+
     Parameters
     ----------
-    image : bytes
-        Read out the bytes of the image
+    image : Union[bytes, IO[bytes], Image.Image]
+        Read out the bytes of the image, a file object of it,
+        or an image already decoded, which is left open
     quality : int, optional
-        Image compression quality, by default 80
+        Image compression quality of lossy formats,
+        by default the quality in configuration file
+    format : str, optional
+        Output format, one of `JPEG`, `WEBP` or `PNG`,
+        by default the format in configuration file
 
     Returns
     -------
     bytes
         Returns the converted picture bytes
     """
-    from .tmpFile import tmpFile
-
-    with tmpFile() as file1, tmpFile() as file2:
-        with open(file1, "wb") as f:
-            f.write(image)
-        with Image.open(file1) as f:
-            f.save(file2, "BMP")
-        for i in reversed(range(quality, 100, 5)):
-            with Image.open(file2) as f:
-                f.save(file1, "PNG", optimize=True, quality=i)
-            if getFileSize(file1) <= MAX_IMAGE_SIZE:
-                break
-        with open(file1, "rb") as f:
-            readData = f.read()
-    return readData + b"\x00" * 16 + token_bytes(16)
+    from . import UtilsConfig
+
+    imageConfig = UtilsConfig.image
+    format = checkImageFormat(format or imageConfig["format"])
+    quality = quality or imageConfig["quality"]
+    if isinstance(image, Image.Image):
+        opened = nullcontext(image)
+    else:
+        opened = Image.open(BytesIO(image) if isinstance(image, bytes) else image)
+    with opened as decoded:
+        decoded.load()
+        prepared = _prepareImage(decoded, format)
+        readData = _encodeImage(prepared, format, quality)
+        if len(readData) > MAX_IMAGE_SIZE:
+            readData = _fitImage(
+                prepared,
+                format,
+                quality,
+                min(quality, imageConfig["min_quality"]),
+                len(readData),
+            )
+    return readData + b"\x00" * IMAGE_NOISE_SIZE + token_bytes(IMAGE_NOISE_SIZE)
+
+
+def renewImageNoise(image: bytes) -> bytes:
+    """Replace the random tail appended by `convertImageFormat`,
+    so that a reused image is never sent with the same bytes twice"""
+    return image[:-IMAGE_NOISE_SIZE] + token_bytes(IMAGE_NOISE_SIZE)
+
+
+def imageExtension(image: bytes) -> str:
+    """File extension of an encoded image, detected from its first bytes"""
+    if image.startswith(b"\x89PNG"):
+        return "png"
+    elif image.startswith(b"\xff\xd8"):
+        return "jpg"
+    elif image[:4] == b"RIFF" and image[8:12] == b"WEBP":
+        return "webp"
+    elif image.startswith(b"GIF8"):
+        return "gif"
+    return "png"